@@ -0,0 +1,216 @@
+# -*- coding: utf-8 -*-
+"""
+Headless batch mode: process many survey CSVs without the dialog.
+
+Jobs come from a manifest CSV with the columns ``csv_path,epsg,app_num``
+(relative paths are resolved against the manifest's folder) or from a
+folder, in which case every ``*.csv`` in it is a job with the EPSG given
+on the command line and the file name as application number.
+
+Every job runs the GeomFromTextWorker logic synchronously on a thread of a
+pool. Each pool thread has its own LayerRegistry (QGIS layers must not be
+shared between threads) and its own psycopg2 connection, and writes its
+plans with submission.commit_result: one transaction per plan, parcel
+numbers reserved under per-block advisory locks, COPY for the features.
+A failed plan is rolled back and reported; the batch goes on.
+
+Run it with the Python interpreter that ships with QGIS (needs psycopg2
+unless ``--dry-run`` is given)::
+
+    python-qgis.bat batch_runner.py plans/manifest.csv --workers 4 --report report.csv
+    python-qgis.bat batch_runner.py plans/ --epsg 26391 --dry-run
+"""
+
+import argparse
+import csv
+import glob
+import importlib
+import os
+import sys
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+PLUGIN_DIR = os.path.dirname(os.path.abspath(__file__))
+
+Job = namedtuple('Job', 'csv_path epsg app_num')
+Outcome = namedtuple('Outcome', 'job success parcels seconds message')
+
+REPORT_COLUMNS = ['csv_path', 'epsg', 'app_num', 'success', 'parcels', 'seconds', 'message']
+
+
+def read_manifest(path):
+    """Jobs listed in a ``csv_path,epsg,app_num`` manifest file."""
+    base_dir = os.path.dirname(os.path.abspath(path))
+    jobs = []
+    with open(path, newline='', encoding='utf-8') as f:
+        for line_num, row in enumerate(csv.DictReader(f), start=2):
+            try:
+                csv_path = row['csv_path'].strip()
+                epsg = int(row['epsg'])
+                app_num = row['app_num'].strip()
+            except (KeyError, TypeError, ValueError, AttributeError):
+                raise ValueError(f'Invalid manifest row {line_num}: expected csv_path, epsg and app_num')
+            jobs.append(Job(os.path.join(base_dir, csv_path), epsg, app_num))
+    return jobs
+
+
+def scan_folder(folder, epsg):
+    """One job per ``*.csv`` in ``folder``, named after the file."""
+    return [Job(path, epsg, os.path.splitext(os.path.basename(path))[0])
+            for path in sorted(glob.glob(os.path.join(folder, '*.csv')))]
+
+
+class BatchRunner:
+    """Runs jobs on a thread pool, one registry and connection per thread."""
+
+    def __init__(self, plugin_dir=PLUGIN_DIR, workers=4, dry_run=False, verbose=False):
+        self.plugin_dir = plugin_dir
+        self.workers = max(1, workers)
+        self.dry_run = dry_run
+        self.verbose = verbose
+        self._local = threading.local()
+        self._resources = []
+        self._resources_lock = threading.Lock()
+
+    def _thread_state(self):
+        state = getattr(self._local, 'state', None)
+        if state is None:
+            from .db_session import LayerRegistry
+            state = self._local.state = {'registry': LayerRegistry(self.plugin_dir, main_thread_layers=False), 'conn': None}
+            with self._resources_lock:
+                self._resources.append(state)
+        return state
+
+    def _connection(self, state):
+        from . import pg_bulk
+        if state['conn'] is None or state['conn'].closed:
+            state['conn'] = pg_bulk.connect(state['registry'].config())
+        return state['conn']
+
+    def process(self, job):
+        """Traverse, join and (unless dry run) commit one job."""
+        from .processing_worker import GeomFromTextWorker
+        from . import submission
+
+        started = time.perf_counter()
+        state = self._thread_state()
+        results = []
+        worker = GeomFromTextWorker(job.csv_path, job.epsg, job.app_num, self.plugin_dir, state['registry'])
+        worker.finished.connect(results.append)
+        if self.verbose:
+            worker.progress.connect(lambda message: print(f'[{job.app_num}] {message}'))
+        worker.run()
+        result = results[0] if results else {'success': False, 'error': 'Worker returned no result'}
+
+        if not result.get('success'):
+            return Outcome(job, False, 0, time.perf_counter() - started, result.get('error', 'Unknown error'))
+        parcels = len(result['plan'])
+        if self.dry_run:
+            return Outcome(job, True, parcels, time.perf_counter() - started, 'dry run, nothing written')
+        try:
+            new_ids, _ = submission.commit_result(self._connection(state), result)
+        except Exception as e:
+            return Outcome(job, False, 0, time.perf_counter() - started, f'Commit failed: {e}')
+        return Outcome(job, True, len(new_ids), time.perf_counter() - started, 'committed')
+
+    def run(self, jobs, on_outcome=None):
+        """Process ``jobs``; returns the outcomes in job order."""
+        outcomes = {}
+        try:
+            with ThreadPoolExecutor(max_workers=self.workers) as pool:
+                futures = {pool.submit(self.process, job): i for i, job in enumerate(jobs)}
+                for future in as_completed(futures):
+                    job = jobs[futures[future]]
+                    try:
+                        outcome = future.result()
+                    except Exception as e:
+                        outcome = Outcome(job, False, 0, 0.0, str(e))
+                    outcomes[futures[future]] = outcome
+                    if on_outcome:
+                        on_outcome(outcome)
+        finally:
+            self.close()
+        return [outcomes[i] for i in range(len(jobs))]
+
+    def close(self):
+        with self._resources_lock:
+            for state in self._resources:
+                if state['conn'] is not None and not state['conn'].closed:
+                    state['conn'].close()
+                state['registry'].invalidate()
+            self._resources = []
+
+
+def write_report(path, outcomes):
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(REPORT_COLUMNS)
+        for o in outcomes:
+            writer.writerow([o.job.csv_path, o.job.epsg, o.job.app_num, o.success,
+                             o.parcels, f'{o.seconds:.2f}', o.message])
+
+
+def _init_qgis():
+    """Start a headless QgsApplication (and Processing) unless one is running."""
+    from qgis.core import QgsApplication
+    app = QgsApplication.instance()
+    if app is None:
+        QgsApplication.setPrefixPath(os.environ.get('QGIS_PREFIX_PATH', ''), True)
+        app = QgsApplication([], False)
+        app.initQgis()
+    try:
+        from processing.core.Processing import Processing
+        Processing.initialize()
+    except ImportError:
+        pass  # Only needed for SpatialJoin=processing
+    return app
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Process a folder or manifest of survey CSVs headlessly.')
+    parser.add_argument('source', help='manifest CSV (csv_path,epsg,app_num) or folder of survey CSVs')
+    parser.add_argument('--epsg', type=int, default=26331, help='EPSG of the CSVs when SOURCE is a folder')
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--dry-run', action='store_true', help='process but do not write to the database')
+    parser.add_argument('--report', help='write a per-plan CSV report to this path')
+    parser.add_argument('--verbose', action='store_true', help='print worker progress messages')
+    args = parser.parse_args(argv)
+
+    jobs = scan_folder(args.source, args.epsg) if os.path.isdir(args.source) else read_manifest(args.source)
+    if not jobs:
+        print(f'No survey CSVs found in {args.source}')
+        return 1
+
+    _init_qgis()
+    from . import pg_bulk
+    if not args.dry_run and not pg_bulk.HAS_PSYCOPG2:
+        print('psycopg2 is required to write results, use --dry-run to only process the plans')
+        return 1
+
+    def on_outcome(outcome):
+        status = 'OK  ' if outcome.success else 'FAIL'
+        print(f'{status} {outcome.job.app_num}: {outcome.parcels} parcels in {outcome.seconds:.1f} s - {outcome.message}')
+
+    started = time.perf_counter()
+    outcomes = BatchRunner(workers=args.workers, dry_run=args.dry_run, verbose=args.verbose).run(jobs, on_outcome)
+    elapsed = time.perf_counter() - started
+
+    succeeded = sum(1 for o in outcomes if o.success)
+    parcels = sum(o.parcels for o in outcomes)
+    print(f'{succeeded}/{len(outcomes)} plans, {parcels} parcels in {elapsed:.1f} s '
+          f'({len(outcomes) / elapsed:.2f} plans/s)')
+    if args.report:
+        write_report(args.report, outcomes)
+        print(f'Report written to {args.report}')
+    return 0 if succeeded == len(outcomes) else 2
+
+
+if __name__ == '__main__':
+    if not __package__:
+        # Run as a script: import the plugin as a package so relative imports work
+        sys.path.insert(0, os.path.dirname(PLUGIN_DIR))
+        __package__ = os.path.basename(PLUGIN_DIR)
+        importlib.import_module(__package__)
+    sys.exit(main())
@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+"""
+Batched coordinate transforms for traverse coordinates.
+
+Transforming every beacon, parcel and road geometry separately pushes the
+same coordinates through PROJ several times, one small call each.
+transform_xy transforms whole coordinate buffers at once instead: they are
+loaded into one QgsLineString, whose transform() hands all its vertices to
+PROJ in a single call, with the same QgsCoordinateTransform (so the same
+operation) the per geometry code used.
+
+TransformedCoords keeps the transformed copy of a TraverseResult's
+``xs``/``ys`` up to date while the traverse is streamed, one chunk at a
+time.
+"""
+
+from array import array
+
+from qgis.core import QgsLineString
+
+
+def transform_xy(xs, ys, tr):
+    """Transform coordinate sequences with ``tr``; returns two array('d')."""
+    if not len(xs):
+        return array('d'), array('d')
+    line = QgsLineString(list(xs), list(ys))
+    line.transform(tr)
+    return array('d', line.xVector()), array('d', line.yVector())
+
+
+class TransformedCoords:
+    """Transformed beacon coordinates of a (growing) TraverseResult."""
+
+    def __init__(self, tr):
+        self.tr = tr
+        self.xs = array('d')
+        self.ys = array('d')
+
+    def update(self, traverse):
+        """Transform the beacons added to ``traverse`` since the last call."""
+        done, n = len(self.xs), len(traverse.xs)
+        if done < n:
+            xs, ys = transform_xy(traverse.xs[done:n], traverse.ys[done:n], self.tr)
+            self.xs.extend(xs)
+            self.ys.extend(ys)
+        return self
+
+    def points(self, indices):
+        """(x, y) tuples of the beacons at ``indices``."""
+        xs, ys = self.xs, self.ys
+        return [(xs[i], ys[i]) for i in indices]
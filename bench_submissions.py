@@ -0,0 +1,276 @@
+# -*- coding: utf-8 -*-
+"""
+Stress benchmark for concurrent plan submissions.
+
+Simulates N QGIS desktops submitting survey plans at the same time against
+a local PostGIS and reports commits/second, latency and whether any parcel
+number was handed out twice. Everything runs in a scratch schema
+(``bench_submissions`` by default) that is recreated on every run.
+
+Two submission modes are compared:
+
+* transactional: the database work of submission.commit_result, the
+  TransactionalCommit path: per-block advisory locks, one counter upsert,
+  then parcels, roads and beacons loaded with PgBulkWriter.copy_rows
+  (staging temp table, ids drawn from the sequence and matched by
+  ordinal) and a single commit. Only the QGIS feature building that
+  precedes the COPY is left out, the rows are generated here;
+* legacy: the old read-then-update of the lookup row followed by separate
+  inserts of parcels, roads and beacons in autocommit mode, as done
+  through the layer edit buffers.
+
+Usage::
+
+    python-qgis.bat bench_submissions.py --dsn "host=localhost dbname=gis user=postgres" \\
+        --submitters 8 --submissions 50 --parcels 5 --blocks 4
+
+Needs the Python interpreter that ships with QGIS (pg_bulk imports
+qgis.core), psycopg2 and a PostGIS enabled database the user may create
+schemas in.
+"""
+
+import argparse
+import io
+import multiprocessing
+import random
+import statistics
+import sys
+import time
+
+try:
+    import psycopg2
+    from psycopg2 import sql
+except ImportError:
+    psycopg2 = None
+
+from parcel_counter import allocate_parcel_numbers, assign_parcel_numbers, count_by_block, lock_blocks
+from pg_bulk import PgBulkWriter
+
+SRID = 26331
+
+SETUP_SQL = """
+DROP SCHEMA IF EXISTS {schema} CASCADE;
+CREATE SCHEMA {schema};
+CREATE TABLE {schema}.parcel_lookup (
+    id serial PRIMARY KEY,
+    lga_num integer NOT NULL,
+    block_num integer NOT NULL,
+    parcel_count integer NOT NULL,
+    UNIQUE (lga_num, block_num)
+);
+CREATE TABLE {schema}.parcels (
+    id serial PRIMARY KEY,
+    lga_num integer,
+    block_num integer,
+    parcel_num integer,
+    app_num text,
+    geometry geometry(Polygon, {srid})
+);
+CREATE TABLE {schema}.parcel_roads (
+    id serial PRIMARY KEY,
+    lga_num integer,
+    block_num integer,
+    parcel_num integer,
+    geom geometry(LineString, {srid})
+);
+CREATE TABLE {schema}.beacons (
+    id serial PRIMARY KEY,
+    beacon text,
+    lga_num integer,
+    block_num integer,
+    parcel_num integer,
+    geometry geometry(Point, {srid})
+);
+"""
+
+PARCEL_COLUMNS = ['lga_num', 'block_num', 'parcel_num', 'app_num', 'geometry']
+ROAD_COLUMNS = ['lga_num', 'block_num', 'parcel_num', 'geom']
+BEACON_COLUMNS = ['beacon', 'lga_num', 'block_num', 'parcel_num', 'geometry']
+
+
+def setup(dsn, schema):
+    """Recreate the scratch schema."""
+    conn = psycopg2.connect(dsn)
+    try:
+        with conn, conn.cursor() as cur:
+            cur.execute(sql.SQL(SETUP_SQL).format(schema=sql.Identifier(schema), srid=sql.Literal(SRID)))
+    finally:
+        conn.close()
+
+
+def make_plan(rng, n_blocks, n_parcels):
+    """Random plan: list of (lga_num, block_num, polygon ewkt, road ewkt, beacons) tuples.
+
+    ``beacons`` are the (beacon number, point ewkt) of the parcel's corners.
+    """
+    lga_num, block_num = 1, rng.randrange(n_blocks) + 1
+    x0, y0 = 500000 + rng.random() * 1000, 800000 + rng.random() * 1000
+    plan = []
+    for i in range(n_parcels):
+        x = x0 + i * 20
+        corners = [(x, y0), (x + 20, y0), (x + 20, y0 + 20), (x, y0 + 20)]
+        ring = ','.join(f'{cx} {cy}' for cx, cy in corners + corners[:1])
+        road = f'SRID={SRID};LINESTRING({x} {y0 - 5},{x + 20} {y0 - 5})'
+        beacons = [(f'B{i * 4 + n}', f'SRID={SRID};POINT({cx} {cy})') for n, (cx, cy) in enumerate(corners)]
+        plan.append((lga_num, block_num, f'SRID={SRID};POLYGON(({ring}))', road, beacons))
+    return plan
+
+
+def _copy_buffer(rows):
+    """Tab separated rows with the trailing ordinal PgBulkWriter.copy_rows expects."""
+    buf = io.StringIO()
+    for ordinal, values in enumerate(rows):
+        buf.write('\t'.join(str(value) for value in values))
+        buf.write(f'\t{ordinal}\n')
+    buf.seek(0)
+    return buf
+
+
+def submit_transactional(conn, schema, plan, app_num):
+    """Same statements as submission.commit_result, on generated rows."""
+    writer = PgBulkWriter(conn)
+    try:
+        block_keys = [(lga_num, block_num) for lga_num, block_num, _, _, _ in plan]
+        counts = count_by_block(block_keys)
+        lock_blocks(conn, counts, table=(schema, 'parcel_lookup'))
+        first_numbers = allocate_parcel_numbers(conn, counts, table=(schema, 'parcel_lookup'))
+        parcel_nums = assign_parcel_numbers(block_keys, first_numbers)
+
+        upis = [(lga_num, block_num, parcel_num)
+                for (lga_num, block_num), parcel_num in zip(block_keys, parcel_nums)]
+        new_ids = writer.copy_rows(schema, 'parcels', PARCEL_COLUMNS, _copy_buffer(
+            (*upi, app_num, parcel[2]) for upi, parcel in zip(upis, plan)))
+        writer.copy_rows(schema, 'parcel_roads', ROAD_COLUMNS, _copy_buffer(
+            (*upi, parcel[3]) for upi, parcel in zip(upis, plan)))
+        writer.copy_rows(schema, 'beacons', BEACON_COLUMNS, _copy_buffer(
+            (beacon, *upi, point) for upi, parcel in zip(upis, plan) for beacon, point in parcel[4]))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return new_ids
+
+
+def submit_legacy(conn, schema, plan, app_num):
+    lookup = sql.Identifier(schema, 'parcel_lookup')
+    parcels = sql.Identifier(schema, 'parcels')
+    roads = sql.Identifier(schema, 'parcel_roads')
+    beacons = sql.Identifier(schema, 'beacons')
+    with conn.cursor() as cur:
+        for lga_num, block_num, ewkt, road, parcel_beacons in plan:
+            cur.execute(sql.SQL('SELECT parcel_count FROM {} WHERE lga_num = %s AND block_num = %s')
+                        .format(lookup), (lga_num, block_num))
+            row = cur.fetchone()
+            parcel_num = row[0] + 1 if row else 1
+            if row:
+                cur.execute(sql.SQL('UPDATE {} SET parcel_count = %s WHERE lga_num = %s AND block_num = %s')
+                            .format(lookup), (parcel_num, lga_num, block_num))
+            else:
+                cur.execute(sql.SQL('INSERT INTO {} (lga_num, block_num, parcel_count) VALUES (%s, %s, %s) '
+                                    'ON CONFLICT (lga_num, block_num) DO NOTHING')
+                            .format(lookup), (lga_num, block_num, parcel_num))
+            cur.execute(sql.SQL('INSERT INTO {} (lga_num, block_num, parcel_num, app_num, geometry) '
+                                'VALUES (%s, %s, %s, %s, ST_GeomFromEWKT(%s))')
+                        .format(parcels), (lga_num, block_num, parcel_num, app_num, ewkt))
+            cur.execute(sql.SQL('INSERT INTO {} (lga_num, block_num, parcel_num, geom) '
+                                'VALUES (%s, %s, %s, ST_GeomFromEWKT(%s))')
+                        .format(roads), (lga_num, block_num, parcel_num, road))
+            for beacon, point in parcel_beacons:
+                cur.execute(sql.SQL('INSERT INTO {} (beacon, lga_num, block_num, parcel_num, geometry) '
+                                    'VALUES (%s, %s, %s, %s, ST_GeomFromEWKT(%s))')
+                            .format(beacons), (beacon, lga_num, block_num, parcel_num, point))
+
+
+def run_submitter(args):
+    """Worker process: submit ``submissions`` plans, return latencies and errors."""
+    submitter, dsn, schema, mode, submissions, n_parcels, n_blocks, seed = args
+    rng = random.Random(seed + submitter)
+    conn = psycopg2.connect(dsn, application_name=f'bench_submitter_{submitter}')
+    conn.autocommit = mode == 'legacy'
+    submit = submit_legacy if mode == 'legacy' else submit_transactional
+    latencies, errors = [], 0
+    try:
+        for i in range(submissions):
+            plan = make_plan(rng, n_blocks, n_parcels)
+            started = time.perf_counter()
+            try:
+                submit(conn, schema, plan, f'BENCH/{submitter}/{i}')
+            except psycopg2.Error:
+                errors += 1
+                continue
+            latencies.append(time.perf_counter() - started)
+    finally:
+        conn.close()
+    return latencies, errors
+
+
+def check(dsn, schema):
+    """Return (parcels, duplicated parcel numbers, blocks whose counter is off)."""
+    conn = psycopg2.connect(dsn)
+    try:
+        with conn.cursor() as cur:
+            parcels = sql.Identifier(schema, 'parcels')
+            lookup = sql.Identifier(schema, 'parcel_lookup')
+            cur.execute(sql.SQL('SELECT count(*) FROM {}').format(parcels))
+            total = cur.fetchone()[0]
+            cur.execute(sql.SQL(
+                'SELECT count(*) FROM (SELECT 1 FROM {} GROUP BY lga_num, block_num, parcel_num '
+                'HAVING count(*) > 1) AS d').format(parcels))
+            duplicates = cur.fetchone()[0]
+            cur.execute(sql.SQL(
+                'SELECT count(*) FROM {lookup} AS l LEFT JOIN ('
+                '    SELECT lga_num, block_num, count(*) AS n FROM {parcels} GROUP BY lga_num, block_num'
+                ') AS p USING (lga_num, block_num) WHERE l.parcel_count <> coalesce(p.n, 0)'
+            ).format(lookup=lookup, parcels=parcels))
+            drifted = cur.fetchone()[0]
+    finally:
+        conn.close()
+    return total, duplicates, drifted
+
+
+def run_benchmark(dsn, schema, mode, submitters, submissions, n_parcels, n_blocks, seed=0):
+    setup(dsn, schema)
+    jobs = [(s, dsn, schema, mode, submissions, n_parcels, n_blocks, seed) for s in range(submitters)]
+    started = time.perf_counter()
+    with multiprocessing.Pool(submitters) as pool:
+        results = pool.map(run_submitter, jobs)
+    elapsed = time.perf_counter() - started
+
+    latencies = sorted(lat for lats, _ in results for lat in lats)
+    errors = sum(err for _, err in results)
+    total, duplicates, drifted = check(dsn, schema)
+    commits = len(latencies)
+    print(f'{mode}: {submitters} submitters x {submissions} plans x {n_parcels} parcels over {n_blocks} blocks')
+    print(f'  {commits} commits in {elapsed:.2f} s = {commits / elapsed:.1f} commits/s '
+          f'({total / elapsed:.1f} parcels/s), {errors} failed')
+    if latencies:
+        p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+        print(f'  latency p50 {statistics.median(latencies) * 1000:.1f} ms, p95 {p95 * 1000:.1f} ms')
+    print(f'  {duplicates} duplicated parcel numbers, {drifted} lookup counters out of step')
+    return commits / elapsed, duplicates
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--dsn', default='host=localhost dbname=postgres user=postgres')
+    parser.add_argument('--schema', default='bench_submissions')
+    parser.add_argument('--mode', choices=['transactional', 'legacy', 'both'], default='both')
+    parser.add_argument('--submitters', type=int, default=8)
+    parser.add_argument('--submissions', type=int, default=50, help='plans per submitter')
+    parser.add_argument('--parcels', type=int, default=5, help='parcels per plan')
+    parser.add_argument('--blocks', type=int, default=4, help='distinct blocks (fewer means more contention)')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    if psycopg2 is None:
+        print('psycopg2 is required for this benchmark')
+        return 1
+    modes = ['transactional', 'legacy'] if args.mode == 'both' else [args.mode]
+    for mode in modes:
+        run_benchmark(args.dsn, args.schema, mode, args.submitters, args.submissions,
+                      args.parcels, args.blocks, args.seed)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+"""
+On-disk cache of the LGA and block boundaries.
+
+LGA and block polygons change rarely, so instead of downloading them from
+PostGIS on every run they are kept in a small SQLite file under the plugin
+directory (geometries as WKB in the layer CRS). Before each use the cache
+is checked against the table with two cheap queries, row count and
+max(primary key), after reloading the provider so that reused layers do
+not answer from their cached count:
+
+* unchanged: polygons are read from disk only;
+* rows appended: only rows with a larger primary key are fetched;
+* anything else (deletions, CRS change, first run): full reload.
+
+Edits to existing rows that keep the count and max id unchanged are not
+detected; delete the cache file to force a reload after such edits.
+
+The batch runner joins on several threads at once: sync() is serialized
+per cache file and connections wait for the SQLite write lock.
+"""
+
+import os
+import sqlite3
+import threading
+import time
+from contextlib import closing
+
+from qgis.core import QgsCoordinateTransform, QgsFeatureRequest, QgsGeometry, QgsProject
+from qgis.PyQt.QtCore import QVariant
+
+from .spatial_join import PolygonIndex
+
+# Seconds a connection waits for another thread's write to finish
+BUSY_TIMEOUT = 30
+
+_sync_locks = {}
+_sync_locks_guard = threading.Lock()
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS freshness (
+    source TEXT PRIMARY KEY,
+    crs TEXT NOT NULL,
+    row_count INTEGER NOT NULL,
+    max_id INTEGER,
+    refreshed_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS boundaries (
+    source TEXT NOT NULL,
+    fid INTEGER NOT NULL,
+    value,
+    wkb BLOB NOT NULL,
+    PRIMARY KEY (source, fid)
+);
+"""
+
+
+def _plain(value):
+    """QVariant NULL to None, anything else unchanged."""
+    if isinstance(value, QVariant) and value.isNull():
+        return None
+    return value
+
+
+def _pk_name(layer):
+    pk_indexes = layer.dataProvider().pkAttributeIndexes()
+    if pk_indexes:
+        return layer.fields().at(pk_indexes[0]).name()
+    return 'id'
+
+
+class BoundaryCache:
+    """SQLite copy of polygon layers, keyed by a source name."""
+
+    def __init__(self, path):
+        self.path = path
+        with _sync_locks_guard:
+            self._sync_lock = _sync_locks.setdefault(os.path.abspath(path), threading.Lock())
+
+    def _connect(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT)
+        conn.executescript(SCHEMA)
+        return conn
+
+    def _store(self, conn, layer, source, attribute, pk, request):
+        request.setSubsetOfAttributes([attribute, pk], layer.fields())
+        rows = []
+        for feat in layer.getFeatures(request):
+            geom = feat.geometry()
+            if geom.isNull():
+                continue
+            rows.append((source, _plain(feat[pk]), _plain(feat[attribute]), bytes(geom.asWkb())))
+        conn.executemany('INSERT OR REPLACE INTO boundaries VALUES (?, ?, ?, ?)', rows)
+        return len(rows)
+
+    def sync(self, layer, source, attribute):
+        """Bring the cached copy of ``layer`` up to date.
+
+        Returns 'fresh', 'incremental' or 'full' depending on what had to
+        be downloaded. One thread at a time per cache file, so concurrent
+        runs do not download the same boundaries twice.
+        """
+        with self._sync_lock:
+            return self._sync(layer, source, attribute)
+
+    def _sync(self, layer, source, attribute):
+        pk = _pk_name(layer)
+        # The registry keeps layers for the whole session and the provider
+        # caches its feature count: ask the table again
+        layer.dataProvider().reloadData()
+        row_count = layer.featureCount()
+        max_id = _plain(layer.maximumValue(layer.fields().indexFromName(pk)))
+        crs = layer.crs().authid()
+
+        with closing(self._connect()) as conn, conn:
+            cached = conn.execute(
+                'SELECT crs, row_count, max_id FROM freshness WHERE source = ?', (source,)).fetchone()
+            if cached == (crs, row_count, max_id):
+                return 'fresh'
+
+            state = 'full'
+            if cached and cached[0] == crs and cached[2] is not None and row_count > cached[1]:
+                request = QgsFeatureRequest().setFilterExpression(f'"{pk}" > {int(cached[2])}')
+                added = self._store(conn, layer, source, attribute, pk, request)
+                if cached[1] + added == row_count:
+                    state = 'incremental'
+            if state == 'full':
+                conn.execute('DELETE FROM boundaries WHERE source = ?', (source,))
+                self._store(conn, layer, source, attribute, pk, QgsFeatureRequest())
+            conn.execute('INSERT OR REPLACE INTO freshness VALUES (?, ?, ?, ?, ?)',
+                         (source, crs, row_count, max_id, time.time()))
+        return state
+
+    def polygon_index(self, layer, source, attribute, crs):
+        """Sync ``layer`` and build a PolygonIndex in ``crs`` from the cache.
+
+        Returns the index and the sync state.
+        """
+        state = self.sync(layer, source, attribute)
+        polygon_index = PolygonIndex(crs)
+        tr = None
+        if layer.crs() != crs:
+            tr = QgsCoordinateTransform(layer.crs(), crs, QgsProject.instance())
+        with closing(self._connect()) as conn:
+            rows = conn.execute('SELECT fid, value, wkb FROM boundaries WHERE source = ?', (source,))
+            for fid, value, wkb in rows:
+                geom = QgsGeometry()
+                geom.fromWkb(wkb)
+                if tr:
+                    geom.transform(tr)
+                polygon_index.add(fid, value, geom)
+        return polygon_index, state
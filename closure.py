@@ -0,0 +1,187 @@
+# -*- coding: utf-8 -*-
+"""
+Traverse closure, precision and Bowditch adjustment for survey parcels.
+
+A parcel is a closed traverse when its last beacon is computed from
+bearing/distance legs and carries the beacon number of its ring start: the
+legs should lead back onto that known point. compute_closures reports for
+all parcels at once:
+
+* the misclosure vector (dx, dy) from the ring start to the computed last
+  beacon and the linear misclosure ``hypot(dx, dy)``;
+* the traverse length, the sum of the bearing/distance legs since the last
+  XY beacon, and the relative precision ``length / misclosure``, shown as
+  1:N.
+
+Rings that end on an XY beacon (every parcel but the last one of a plan
+must) or do not repeat their start have no misclosure to measure; their
+entries are None and reported as N/A. With NumPy (shipped with QGIS) the
+lengths are computed from cumulative sums over the coordinate buffers,
+without a loop over the beacons.
+
+bowditch_adjust distributes the misclosure of a parcel over its vertices in
+proportion to the distance travelled (compass rule), so the ring closes
+exactly. Beacons given as XY are control points and never move; parcels
+with an XY beacon inside the traverse, or a misclosure above the limit, are
+left as they are. Moving a parcel's last beacon also moves the
+bearing/distance beacons computed from it, up to the next XY beacon.
+"""
+
+import math
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - QGIS always ships NumPy
+    np = None
+
+
+class ClosureTable:
+    """Closure of every parcel of a TraverseResult, as parallel lists."""
+
+    __slots__ = ('parcel_ids', 'dx', 'dy', 'misclosure', 'length', 'adjusted')
+
+    def __init__(self, parcel_ids, dx, dy, length):
+        self.parcel_ids = list(parcel_ids)
+        self.dx = list(dx)
+        self.dy = list(dy)
+        self.misclosure = [None if a is None else math.hypot(a, b) for a, b in zip(self.dx, self.dy)]
+        self.length = list(length)
+        self.adjusted = [False] * len(self.parcel_ids)
+
+    def __len__(self):
+        return len(self.parcel_ids)
+
+    def precision(self, k):
+        """Relative precision N of 1:N (inf for a perfect closure), None when N/A."""
+        if self.misclosure[k] is None:
+            return None
+        if self.misclosure[k] == 0:
+            return math.inf
+        return self.length[k] / self.misclosure[k]
+
+    def closed(self):
+        """Indices of the parcels that close on their ring start."""
+        return [k for k in range(len(self)) if self.misclosure[k] is not None]
+
+    def worst(self):
+        """Index of the closed parcel with the lowest relative precision, or None."""
+        closed = [k for k in self.closed() if not math.isnan(self.misclosure[k])]
+        if not closed:
+            return None
+        return min(closed, key=self.precision)
+
+    def as_dicts(self):
+        return [{'parcel_id': pid, 'misclosure': self.misclosure[k], 'dx': self.dx[k], 'dy': self.dy[k],
+                 'length': self.length[k], 'precision': self.precision(k), 'adjusted': self.adjusted[k]}
+                for k, pid in enumerate(self.parcel_ids)]
+
+
+def format_precision(n):
+    if n is None:
+        return 'N/A'
+    return '1:inf' if math.isinf(n) else f'1:{n:,.0f}'
+
+
+def _ring_bounds(traverse):
+    """First and last beacon index of every parcel ring."""
+    first = [start - 1 if k else start for k, start in enumerate(traverse.parcel_beacon_start)]
+    last = [end - 1 for end in traverse.parcel_beacon_end]
+    return first, last
+
+
+def _closes(traverse, a, b):
+    """True when the ring ``a..b`` ends on a traversed beacon repeating its start."""
+    if b <= a or traverse.anchors[b]:
+        return False
+    beacon_num = traverse.beacon_nums[b]
+    return bool(beacon_num) and beacon_num == traverse.beacon_nums[a]
+
+
+def compute_closures(traverse):
+    """ClosureTable of every parcel of ``traverse``."""
+    first, last = _ring_bounds(traverse)
+    if not first:
+        return ClosureTable([], [], [], [])
+    xs, ys = traverse.xs, traverse.ys
+    closing = [k for k, (a, b) in enumerate(zip(first, last)) if _closes(traverse, a, b)]
+    dx = [None] * len(first)
+    dy = [None] * len(first)
+    length = [None] * len(first)
+    if not closing:
+        return ClosureTable(traverse.parcel_ids, dx, dy, length)
+
+    if np is not None:
+        np_xs = np.frombuffer(xs, dtype=np.float64)
+        np_ys = np.frombuffer(ys, dtype=np.float64)
+        np_anchors = np.frombuffer(traverse.anchors, dtype=np.int8).astype(bool)
+        legs = np.concatenate(([0.0], np.hypot(np.diff(np_xs), np.diff(np_ys))))
+        travelled = np.cumsum(legs)
+        # Index of the latest XY beacon at or before every beacon
+        last_anchor = np.maximum.accumulate(np.where(np_anchors, np.arange(len(np_anchors)), -1))
+        first_idx = np.asarray([first[k] for k in closing])
+        last_idx = np.asarray([last[k] for k in closing])
+        # The legs run from the ring start or the last XY beacon after it
+        leg_start = np.maximum(first_idx, last_anchor[last_idx])
+        closing_dx = (np_xs[last_idx] - np_xs[first_idx]).tolist()
+        closing_dy = (np_ys[last_idx] - np_ys[first_idx]).tolist()
+        closing_length = (travelled[last_idx] - travelled[leg_start]).tolist()
+        for j, k in enumerate(closing):
+            dx[k], dy[k], length[k] = closing_dx[j], closing_dy[j], closing_length[j]
+        return ClosureTable(traverse.parcel_ids, dx, dy, length)
+
+    anchors = traverse.anchors
+    for k in closing:
+        a, b = first[k], last[k]
+        s = b
+        while s > a and not anchors[s]:
+            s -= 1
+        dx[k] = xs[b] - xs[a]
+        dy[k] = ys[b] - ys[a]
+        length[k] = sum(math.hypot(xs[i] - xs[i - 1], ys[i] - ys[i - 1]) for i in range(s + 1, b + 1))
+    return ClosureTable(traverse.parcel_ids, dx, dy, length)
+
+
+def bowditch_adjust(traverse, table, max_misclosure):
+    """Adjust ``traverse`` in place with the compass rule.
+
+    Only closed parcels with ``0 < misclosure <= max_misclosure`` and no XY
+    beacon after their ring start are adjusted; ``table.adjusted`` records which.
+    Returns the number of adjusted parcels.
+    """
+    xs, ys, anchors = traverse.xs, traverse.ys, traverse.anchors
+    first, last = _ring_bounds(traverse)
+    carry_x = carry_y = 0.0
+    adjusted = 0
+    for k in range(len(first)):
+        a, b = first[k], last[k]
+        own = range(traverse.parcel_beacon_start[k], traverse.parcel_beacon_end[k])
+        original_last = (xs[b], ys[b])
+
+        # Follow the move of the beacon this parcel was traversed from
+        for i in own:
+            if anchors[i]:
+                carry_x = carry_y = 0.0
+            if carry_x or carry_y:
+                xs[i] += carry_x
+                ys[i] += carry_y
+
+        misclosure = table.misclosure[k]
+        if (misclosure is not None and 0 < misclosure <= max_misclosure and table.length[k] > 0
+                and not any(anchors[i] for i in range(a + 1, b + 1))):
+            dx, dy, length = table.dx[k], table.dy[k], table.length[k]
+            travelled = 0.0
+            prev_x, prev_y = xs[a], ys[a]
+            for i in range(a + 1, b + 1):
+                # Legs are measured on the unadjusted positions
+                travelled += math.hypot(xs[i] - prev_x, ys[i] - prev_y)
+                prev_x, prev_y = xs[i], ys[i]
+                xs[i] -= dx * travelled / length
+                ys[i] -= dy * travelled / length
+            # Land exactly on the start so the ring closes
+            xs[b], ys[b] = xs[a], ys[a]
+            table.adjusted[k] = True
+            adjusted += 1
+
+        carry_x = xs[b] - original_last[0]
+        carry_y = ys[b] - original_last[1]
+    return adjusted
@@ -0,0 +1,227 @@
+# -*- coding: utf-8 -*-
+"""
+Background write of an approved survey plan.
+
+After the review dialog the plugin used to write the plan on the QGIS main
+thread: parcel numbers, parcels, roads, beacons and the send_request.py
+notification, freezing QGIS until the last insert returned. CommitWorker
+runs the same stages on a QThread, like GeomFromTextWorker does for the
+processing:
+
+1. parcels, then the lookup counters, then roads and beacons carrying the
+   UPI;
+2. one notification for the application with the UPI of every parcel,
+   queued in the outbox.
+
+Whenever psycopg2 is used, everything written to the database goes over
+one connection in one transaction, so cancel() at any point rolls it all
+back (and interrupts a running statement):
+
+* ``TransactionalCommit``, or ``AllocateCountersInSql``: parcel numbers are
+  reserved in SQL and the plan is written by submission.commit_result.
+  Reserved numbers cannot share a transaction with provider writes, so
+  ``AllocateCountersInSql`` always takes this path;
+* ``BulkCopy`` alone: features are loaded with COPY and the counters are
+  bumped on the same connection.
+
+Without them the features and counters go through the layer providers,
+which commit every call: there cancellation is honoured until the first
+parcel is written.
+
+The finished signal carries only what the main thread needs to zoom and
+report: the new parcel ids, the UPI of every parcel and the outcome.
+"""
+
+import threading
+
+from qgis.core import QgsFeature, QgsFeatureRequest
+from qgis.PyQt.QtCore import QObject, pyqtSignal
+
+from . import parcel_counter, pg_bulk, submission
+
+
+class CommitCancelled(Exception):
+    pass
+
+
+class CommitWorker(QObject):
+    finished = pyqtSignal(object)  # Emitted when the write is done, passes the outcome
+    progress = pyqtSignal(str)     # Progress messages
+
+    def __init__(self, result):
+        super().__init__()
+        self.result = result
+        self._cancelled = threading.Event()
+        self._conn = None
+        self._written = False
+
+    def cancel(self):
+        """Ask the worker to stop; safe to call from the GUI thread."""
+        self._cancelled.set()
+        conn = self._conn
+        if conn is not None and not conn.closed:
+            # Interrupts the statement running on the worker thread
+            conn.cancel()
+
+    def _check_cancelled(self):
+        if self._cancelled.is_set():
+            raise CommitCancelled()
+
+    def run(self):
+        result = self.result
+        config = result['config']
+        plan = result['plan']
+        transactional = config.getboolean('PERFORMANCE', 'TransactionalCommit', fallback=False)
+        bulk = transactional or config.getboolean('PERFORMANCE', 'BulkCopy', fallback=False)
+        allocate_in_sql = transactional or config.getboolean('PERFORMANCE', 'AllocateCountersInSql', fallback=False)
+        if (bulk or allocate_in_sql) and not pg_bulk.HAS_PSYCOPG2:
+            self.progress.emit('psycopg2 not available, using row-by-row inserts')
+            transactional = bulk = allocate_in_sql = False
+        if allocate_in_sql and not transactional:
+            # Numbers reserved in SQL must be rolled back with the features
+            self.progress.emit('Parcel numbers reserved in SQL, writing the plan in one transaction')
+            transactional = True
+
+        try:
+            if transactional:
+                self._check_cancelled()
+                self._conn = pg_bulk.connect(config)
+                self.progress.emit('Writing parcels, roads and beacons in one transaction...')
+                new_ids, _ = submission.commit_result(self._conn, result)
+                self._written = True
+            else:
+                new_ids = self._write(result, plan, bulk)
+        except CommitCancelled:
+            self._rollback()
+            self.finished.emit({'success': False, 'cancelled': True, 'written': self._written})
+            return
+        except Exception as e:
+            self._rollback()
+            if self._cancelled.is_set():
+                self.finished.emit({'success': False, 'cancelled': True, 'written': self._written})
+            else:
+                self.finished.emit({'success': False, 'error': str(e), 'written': self._written})
+            return
+        finally:
+            if self._conn is not None and not self._conn.closed:
+                self._conn.close()
+
+        self.progress.emit(f'Added {len(new_ids)} parcels')
+        notify_error = None
+        if len(plan):
+            self.progress.emit('Queueing the application notification...')
+            notify_error = self._notify(result, plan)
+        self.finished.emit({
+            'success': True,
+            'new_ids': new_ids,
+            'upi_dict': plan.upi_dict(),
+            'notify_error': notify_error,
+        })
+
+    def _rollback(self):
+        if self._conn is not None and not self._conn.closed:
+            self._conn.rollback()
+
+    def _write(self, result, plan, bulk):
+        parcels, roads, beacons = result['parcels'], result['roads'], result['beacons']
+        writer = None
+        if bulk:
+            self._check_cancelled()
+            self._conn = pg_bulk.connect(result['config'])
+            writer = pg_bulk.PgBulkWriter(self._conn)
+
+        self._check_cancelled()
+        self.progress.emit('Adding parcels to database...')
+        parcels_feats = plan.parcel_features(parcels.fields())
+        if writer:
+            new_ids = writer.copy_layer_features(parcels, parcels_feats)
+        else:
+            ok, added = parcels.dataProvider().addFeatures(parcels_feats)
+            self._written = True
+            if not ok:
+                raise RuntimeError('; '.join(parcels.dataProvider().errors()) or 'Could not add the parcels')
+            new_ids = [feat.id() for feat in added]
+
+        self._check_cancelled()
+        self.progress.emit('Updating parcel counters...')
+        blocks = set(plan.block_keys())
+        if writer:
+            # Same transaction as the COPY, rolled back with it
+            parcel_counter.allocate_parcel_numbers(self._conn, {key: 1 for key in blocks})
+        else:
+            self._update_counters(result['parcel_lkp'], blocks)
+
+        self._check_cancelled()
+        self.progress.emit('Adding roads and beacons...')
+        roads_feats = plan.road_features(roads.fields())
+        beacons_feats = plan.beacon_features(beacons.fields())
+        if writer:
+            writer.copy_layer_features(roads, roads_feats)
+            writer.copy_layer_features(beacons, beacons_feats)
+            self._check_cancelled()
+            self._conn.commit()
+        else:
+            roads.dataProvider().addFeatures(roads_feats)
+            beacons.dataProvider().addFeatures(beacons_feats)
+        self._written = True
+        return new_ids
+
+    def _update_counters(self, parcel_lkp, block_keys):
+        """Bump the lookup counter of every block by one, through the provider."""
+        provider = parcel_lkp.dataProvider()
+        fields = parcel_lkp.fields()
+        count_idx = fields.indexFromName('parcel_count')
+        new_counters = []
+        for lga_num, block_num in block_keys:
+            request = QgsFeatureRequest().setFilterExpression(f'("block_num" = {block_num}) AND ("lga_num" = {lga_num})')
+            counter = next(parcel_lkp.getFeatures(request), None)
+            if counter is not None:
+                provider.changeAttributeValues({counter.id(): {count_idx: counter['parcel_count'] + 1}})
+            else:
+                counter = QgsFeature(fields)
+                counter.setAttribute(fields.indexFromName('lga_num'), lga_num)
+                counter.setAttribute(fields.indexFromName('block_num'), block_num)
+                counter.setAttribute(count_idx, 1)
+                new_counters.append(counter)
+        if new_counters:
+            provider.addFeatures(new_counters)
+
+    def _notify(self, result, plan):
+        """Queue the notification for the application; returns an error message or None."""
+        from . import outbox
+        payload = notification_payload(result['app_num'], plan, self._lga_names(result['lga'], plan))
+        # OPTIMIZED: Stored in the durable outbox and delivered in the background,
+        # the commit does not wait for the web service
+        try:
+            outbox.get_drainer(result['config']).put(payload)
+        except Exception as e:
+            return str(e)
+        return None
+
+    def _lga_names(self, lga, plan):
+        """``{lga_num: lga_name}`` of the plan's LGAs, in one request."""
+        lga_nums = sorted({n for n in plan.lga_num if n is not None})
+        if not lga_nums:
+            return {}
+        request = QgsFeatureRequest().setFilterExpression(f'"lga_num" IN ({", ".join(str(n) for n in lga_nums)})')
+        request.setFlags(QgsFeatureRequest.NoGeometry)
+        request.setSubsetOfAttributes(['lga_num', 'lga_name'], lga.fields())
+        return {feat['lga_num']: feat['lga_name'] for feat in lga.getFeatures(request)}
+
+
+def notification_payload(app_num, plan, lga_names):
+    """One notification carrying the UPI of every parcel of ``plan``.
+
+    The four original fields describe the first parcel, so services that
+    only read those keep working; ``upis`` lists every parcel as a compact
+    row in the order of ``upi_columns``.
+    """
+    lga_num, block_num, parcel_num = plan.upi(0)
+    return {
+        'application_number': app_num,
+        'lga_name': lga_names.get(lga_num),
+        'block_number': str(block_num),
+        'parcel_number': str(parcel_num),
+        'upi_columns': ['parcel_id', 'lga_name', 'lga_num', 'block_num', 'parcel_num'],
+        'upis': [[pid, lga_names.get(upi[0]), *upi] for pid, upi in plan.upi_dict().items()],
+    }
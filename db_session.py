@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+"""
+Database session shared across plugin runs.
+
+LayerRegistry is owned by GeomFromTextOptimized for the lifetime of the
+plugin. It reads config.ini once (again only when the file changes) and
+creates the six postgres layers used by the worker on first use; later
+submissions get the same layers back after a cheap validity check, so
+they skip the connection and schema introspection cost. Layers are only
+recreated after invalidate(), which the worker calls when a run fails
+unexpectedly.
+
+Layers created on a worker thread are moved to the main thread, where the
+GUI uses them after the run. The headless batch runner keeps its layers
+on the pool thread that created them (``main_thread_layers=False``).
+"""
+
+import configparser
+import os
+import threading
+
+from qgis.core import QgsDataSourceUri, QgsVectorLayer
+from qgis.PyQt.QtCore import QCoreApplication, QThread
+
+# schema, table, geometry column, layer name, default subset string
+LAYER_CONFIGS = [
+    ('public', 'land_registration___beacons', 'geometry', 'beacons', '1=0'),  # Load schema only
+    ('public', 'land_registration___parcels', 'geometry', 'parcels', '1=0'),  # Load schema only
+    ('public', 'land_registration___blocks', 'geometry', 'blocks', ''),       # Restricted to the parcels bbox before the join
+    ('public', 'ogun_admin___lgas', 'geometry', 'lga', ''),                  # Restricted to the parcels bbox before the join
+    ('public', 'land_registration___parcel_roads', 'geom', 'roads', '1=0'),  # Load schema only
+    ('public', 'land_registration___parcel_lookup', '', 'parcel_lkp', '1=0') # Load schema only
+]
+
+# OPTIMIZED: Add maximum performance parameters for PostgreSQL
+# These are the most aggressive settings for speed
+CONNECTION_PARAMS = [
+    "connect_timeout=3",            # 3 second timeout for ultra-fast failure detection
+    "application_name=geom_from_text",  # Identify connection
+    "tcp_keepalives_idle=30",       # Keep connection alive
+    "tcp_keepalives_interval=5",    # Check connection every 5 seconds
+    "tcp_keepalives_count=3",       # Retry 3 times before giving up
+    "options='-c statement_timeout=15000'",  # 15 second query timeout
+    "options='-c idle_in_transaction_session_timeout=15000'",  # 15 second idle timeout
+    "options='-c synchronous_commit=off'",   # Faster commits
+    "options='-c wal_buffers=32MB'",         # Larger WAL buffers
+    "options='-c shared_buffers=512MB'",     # Larger shared buffers
+    "options='-c work_mem=64MB'",            # More memory for operations
+    "options='-c maintenance_work_mem=256MB'", # More memory for maintenance
+]
+
+
+class LayerError(Exception):
+    """Raised when one of the postgres layers cannot be loaded."""
+
+
+class LayerRegistry:
+    """Plugin-lifetime cache of config.ini and the postgres layers."""
+
+    def __init__(self, plugin_dir, main_thread_layers=True):
+        self.plugin_dir = plugin_dir
+        self.main_thread_layers = main_thread_layers
+        self.ini_path = os.path.join(plugin_dir, 'config.ini')
+        self._config = None
+        self._config_mtime = None
+        self._layers = {}
+        self._lock = threading.Lock()
+
+    def config(self):
+        """Parsed config.ini, re-read only when the file was modified."""
+        mtime = os.path.getmtime(self.ini_path) if os.path.exists(self.ini_path) else None
+        if self._config is None or mtime != self._config_mtime:
+            config = configparser.ConfigParser()
+            config.read(self.ini_path)
+            if self._config is not None:
+                # Connection settings may have changed
+                self.invalidate()
+            self._config = config
+            self._config_mtime = mtime
+        return self._config
+
+    def uri(self):
+        """QgsDataSourceUri with the [PG] connection and performance parameters."""
+        config = self.config()
+        uri = QgsDataSourceUri()
+        uri.setConnection(config['PG']['Host'].strip(), config['PG']['Port'].strip(),
+                          config['PG']['Database'].strip(), config['PG']['UserName'].strip(),
+                          config['PG']['Password'].strip())
+        for param in CONNECTION_PARAMS:
+            uri.setParam(param.split('=')[0], param.split('=')[1])
+        return uri
+
+    def _is_usable(self, layer):
+        return layer.isValid() and layer.dataProvider() is not None and layer.dataProvider().isValid()
+
+    def layers(self):
+        """Return ``(layers, reused)``, creating the layers if needed.
+
+        Reused layers get their default subset strings back. Raises
+        LayerError naming the first layer that failed to load.
+        """
+        self.config()
+        with self._lock:
+            if self._layers and all(self._is_usable(layer) for layer in self._layers.values()):
+                for _, _, _, layer_name, subset in LAYER_CONFIGS:
+                    layer = self._layers[layer_name]
+                    if layer.subsetString() != subset:
+                        layer.setSubsetString(subset)
+                return self._layers, True
+
+            uri = self.uri()
+            layers = {}
+            main_thread = None
+            if self.main_thread_layers and QCoreApplication.instance():
+                main_thread = QCoreApplication.instance().thread()
+            for schema, table, geom_col, layer_name, subset in LAYER_CONFIGS:
+                uri.setDataSource(schema, table, geom_col, subset)  # Use subset to load schema only
+                layer = QgsVectorLayer(uri.uri(), layer_name, 'postgres')
+                if not layer.isValid():
+                    raise LayerError(f'Failed to load layer: {layer_name}')
+                layer.setReadOnly(False)  # Allow writes
+                # Layers outlive the worker thread that created them and are
+                # used by the GUI event loop
+                if main_thread is not None and QThread.currentThread() != main_thread:
+                    layer.moveToThread(main_thread)
+                layers[layer_name] = layer
+            self._layers = layers
+            return self._layers, False
+
+    def invalidate(self):
+        """Drop the layers so the next run reconnects."""
+        self._layers = {}
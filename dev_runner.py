@@ -8,6 +8,12 @@ import sys
 import os
 from pathlib import Path
 
+# Time QGIS may spend importing geom_from_text.py at startup (milliseconds)
+IMPORT_BUDGET_MS = 150
+
+# Modules that must only be loaded once the tool is first used
+DEFERRED_MODULES = ("processing", "processing_worker", "geom_from_text_dialog", "pg_bulk", "numpy", "psycopg2")
+
 # Add the current directory to Python path so we can import our plugin
 current_dir = Path(__file__).parent
 sys.path.insert(0, str(current_dir))
@@ -19,7 +25,11 @@ def test_plugin_functionality():
     try:
         # Test imports
         print("✓ Testing imports...")
-        from processing_worker import GeomFromTextWorker
+        # The worker uses package-relative imports, import it through the package
+        import importlib
+        if str(current_dir.parent) not in sys.path:
+            sys.path.insert(0, str(current_dir.parent))
+        importlib.import_module(f"{current_dir.name}.processing_worker").GeomFromTextWorker
         print("✓ GeomFromTextWorker imported successfully")
         
         # Test configuration
@@ -63,18 +73,299 @@ def create_test_csv():
     """Create a test CSV file for development"""
     test_csv_content = """parcel_id,beacon_num,x,y,deg,min,dist,offset
 P001,B001,123456.789,987654.321,,,,
-P001,B002,,,,45,30,100.5,5.0
-P001,B003,,,,90,15,75.2,
-P001,B004,,,,135,45,120.8,3.5
+P001,B002,,,45,30,100.5,5.0
+P001,B003,,,90,15,75.2,
+P001,B004,123530.125,987580.704,,,,3.5
 P002,B005,234567.890,876543.210,,,,
-P002,B006,,,,180,20,85.0,2.0
-P002,B007,,,,225,10,95.3,
-P002,B008,,,,270,30,110.2,4.0"""
+P002,B006,,,180,20,85.0,2.0
+P002,B007,,,225,10,95.3,
+P002,B008,,,270,30,110.2,4.0"""
     
     with open('test_data.csv', 'w') as f:
         f.write(test_csv_content)
     print("✓ Test CSV file created: test_data.csv")
 
+def run_traverse_engine(csv_path=None):
+    """Parse a survey CSV with the traverse engine (no QGIS needed)"""
+    import time
+    from traverse_engine import read_csv, TraverseError
+
+    if csv_path is None:
+        csv_path = input("CSV path [test_data.csv]: ").strip() or "test_data.csv"
+    if not os.path.exists(csv_path):
+        print(f"❌ File not found: {csv_path}")
+        return False
+
+    start_time = time.perf_counter()
+    try:
+        traverse = read_csv(csv_path)
+    except TraverseError as e:
+        print(f"❌ Traverse error: {e}")
+        return False
+    elapsed = time.perf_counter() - start_time
+
+    print(f"✓ Traversed {traverse.beacon_count} beacons in {elapsed * 1000:.1f} ms")
+    print(f"   Parcels: {traverse.parcel_count}")
+    print(f"   Roads: {traverse.road_count}")
+    for k, parcel_id in enumerate(traverse.parcel_ids[:5]):
+        print(f"   {parcel_id}: {len(traverse.ring_range(k))} ring vertices")
+    return True
+
+def check_csv(csv_path=None):
+    """Report every problem in a survey CSV at once (no QGIS or database needed)"""
+    from plan_check import check_plan
+    from traverse_engine import TraverseError
+
+    if csv_path is None:
+        csv_path = input("CSV path [test_data.csv]: ").strip() or "test_data.csv"
+    if not os.path.exists(csv_path):
+        print(f"❌ File not found: {csv_path}")
+        return False
+    tolerance = input("Misclosure tolerance (blank to skip): ").strip()
+
+    try:
+        report = check_plan(csv_path, float(tolerance) if tolerance else None)
+    except (TraverseError, ValueError) as e:
+        print(f"❌ {e}")
+        return False
+    print(("✓ " if report.ok else "❌ ") + report.summary(limit=50))
+    print(f"   Checked in {report.seconds * 1000:.1f} ms")
+    return report.ok
+
+def check_closures():
+    """Check the closure report on test_data.csv and on a closed traverse (no QGIS needed)"""
+    import math
+    from closure import compute_closures, format_precision
+    from traverse_engine import read_csv, traverse_rows
+
+    create_test_csv()
+    ok = True
+    # Both parcels end on an XY beacon or do not return to their start: nothing to measure
+    table = compute_closures(read_csv("test_data.csv"))
+    for k, parcel_id in enumerate(table.parcel_ids):
+        print(f"   {parcel_id}: misclosure {table.misclosure[k]}, precision {format_precision(table.precision(k))}")
+        ok &= table.misclosure[k] is None
+    ok &= table.worst() is None
+
+    # A 100 m square traversed back onto its first beacon, the last leg 0.05 m short
+    rows = [["P001", "B001", "1000", "2000", "", "", "", ""],
+            ["P001", "B002", "", "", "90", "0", "100", ""],
+            ["P001", "B003", "", "", "180", "0", "100", ""],
+            ["P001", "B004", "", "", "270", "0", "100", ""],
+            ["P001", "B001", "", "", "0", "0", "99.95", ""]]
+    table = compute_closures(traverse_rows(rows))
+    print(f"   Closed square: misclosure {table.misclosure[0]:.3f}, length {table.length[0]:.2f}, "
+          f"precision {format_precision(table.precision(0))}")
+    ok &= math.isclose(table.misclosure[0], 0.05, abs_tol=1e-6)
+    ok &= math.isclose(table.length[0], 399.95, abs_tol=1e-6)
+    ok &= table.worst() == 0
+    print("✓ Closures reported as expected" if ok else "❌ Unexpected closure report")
+    return ok
+
+def check_unmatched_parcels():
+    """Check that a parcel outside every LGA/block still gets parcel numbers (no QGIS needed)"""
+    from plan_store import PlanStore, DEFAULT_BLOCK
+    from parcel_counter import assign_parcel_numbers, count_by_block
+
+    plan = PlanStore()
+    plan.lga_num = [None] * 3
+    plan.block_num = [None] * 3
+    # Join results: two parcels in LGA 12 block 4, one centroid outside every polygon
+    defaulted = [plan.set_block(0, 12, 4), plan.set_block(1, None, None), plan.set_block(2, 12, 4)]
+    block_keys = plan.block_keys()
+    counts = count_by_block(block_keys)
+    # First numbers as the upsert would return them, in its sorted key order
+    first_numbers = {key: 7 for key in sorted(counts)}
+    parcel_nums = assign_parcel_numbers(block_keys, first_numbers)
+    print(f"   Blocks: {dict(counts)}, parcel numbers: {parcel_nums}")
+
+    ok = defaulted == [False, True, False]
+    ok &= block_keys[1] == (DEFAULT_BLOCK, DEFAULT_BLOCK)
+    ok &= parcel_nums == [7, 7, 8]
+    try:
+        count_by_block([(12, 4), (None, None)])
+        ok = False
+    except ValueError:
+        pass
+    print("✓ Unmatched parcel defaulted to block 999" if ok else "❌ Unexpected block keys")
+    return ok
+
+def measure_import_time(budget_ms=IMPORT_BUDGET_MS):
+    """Import the plugin like QGIS does at startup and check the time budget (needs QGIS Python)"""
+    import importlib
+    import time
+
+    package = current_dir.name
+    sys.path.insert(0, str(current_dir.parent))
+    loaded_before = set(sys.modules)
+    start_time = time.perf_counter()
+    try:
+        importlib.import_module(f"{package}.geom_from_text")
+    except ImportError as e:
+        print(f"❌ Import error: {e}")
+        return False
+    elapsed_ms = (time.perf_counter() - start_time) * 1000
+
+    print(f"✓ geom_from_text imported in {elapsed_ms:.1f} ms (budget {budget_ms} ms)")
+    loaded = set(sys.modules) - loaded_before
+    eager = [name for name in loaded if name.split(".")[-1] in DEFERRED_MODULES or name in DEFERRED_MODULES]
+    for name in sorted(eager):
+        print(f"⚠ {name} was imported at startup")
+    return elapsed_ms <= budget_ms and not eager
+
+def write_synthetic_csv(csv_path, beacons=50000, per_parcel=10):
+    """Write a plan of ``beacons`` XY beacons, ``per_parcel`` to a parcel"""
+    import math
+    with open(csv_path, 'w') as f:
+        f.write("parcel_id,beacon_num,x,y,deg,min,dist,offset\n")
+        for n in range(beacons):
+            p, b = divmod(n, per_parcel)
+            # Beacons of a parcel on a circle in its own 100 m cell
+            angle = 2 * math.pi * b / per_parcel
+            x = 500000 + (p % 100) * 100 + 40 * (1 + math.cos(angle))
+            y = 700000 + (p // 100) * 100 + 40 * (1 + math.sin(angle))
+            f.write(f"P{p:05d},B{n:06d},{x:.3f},{y:.3f},,,,\n")
+
+def benchmark_feature_building(beacons=50000):
+    """Time per-row beacon feature building against attribute templates (needs QGIS Python)"""
+    import tempfile
+    import time
+    from datetime import date
+    try:
+        from qgis.core import QgsFeature, QgsField, QgsFields, QgsGeometry, QgsPointXY
+        from qgis.PyQt.QtCore import QDate, QVariant
+    except ImportError as e:
+        print(f"❌ Import error: {e}")
+        return False
+    from plan_store import PlanStore
+    from traverse_engine import read_csv
+
+    csv_path = os.path.join(tempfile.mkdtemp(), 'bench_50k.csv')
+    write_synthetic_csv(csv_path, beacons)
+    traverse = read_csv(csv_path)
+    plan = PlanStore('bench', 'new')
+    for _ in range(traverse.parcel_count):
+        plan.add_parcel(0.0, 0.0, 0.0)
+    plan.set_traverse(traverse)
+    plan.lga_num = [1] * len(plan)
+    plan.block_num = [2] * len(plan)
+    plan.parcel_num = list(range(1, len(plan) + 1))
+
+    fields = QgsFields()
+    for name, kind in (('id', QVariant.Int), ('beacon_num', QVariant.String), ('x', QVariant.Double),
+                       ('y', QVariant.Double), ('date_created', QVariant.Date), ('lga_num', QVariant.Int),
+                       ('block_num', QVariant.Int), ('parcel_num', QVariant.Int)):
+        fields.append(QgsField(name, kind))
+
+    # What the worker used to do for every beacon
+    start_time = time.perf_counter()
+    per_row = []
+    for k in range(len(plan)):
+        for i in range(plan.beacon_start[k], plan.beacon_end[k]):
+            feat = QgsFeature(fields)
+            feat.setAttribute(fields.indexFromName('beacon_num'), plan.beacon_nums[i])
+            feat.setAttribute(fields.indexFromName('x'), plan.xs[i])
+            feat.setAttribute(fields.indexFromName('y'), plan.ys[i])
+            feat.setAttribute(fields.indexFromName('date_created'), QDate(date.today()))
+            feat['lga_num'] = plan.lga_num[k]
+            feat['block_num'] = plan.block_num[k]
+            feat['parcel_num'] = plan.parcel_num[k]
+            feat.setGeometry(QgsGeometry.fromPointXY(QgsPointXY(plan.map_xs[i], plan.map_ys[i])))
+            per_row.append(feat)
+    per_row_time = time.perf_counter() - start_time
+
+    start_time = time.perf_counter()
+    templated = plan.beacon_features(fields)
+    template_time = time.perf_counter() - start_time
+
+    assert per_row[-1].attributes() == templated[-1].attributes()
+    n = len(templated)
+    print(f"✓ {n} beacons in {traverse.parcel_count} parcels")
+    print(f"   Per-row setAttribute:   {per_row_time * 1000:8.1f} ms ({per_row_time / n * 1e6:.2f} µs/beacon)")
+    print(f"   Attribute templates:    {template_time * 1000:8.1f} ms ({template_time / n * 1e6:.2f} µs/beacon)")
+    print(f"   Speed-up: {per_row_time / template_time:.2f}x")
+    return template_time < per_row_time
+
+def start_stand_in_service(fail_first=1):
+    """Local HTTP server answering POSTs like the web service; returns (server, url, received)"""
+    import gzip
+    import json
+    import threading
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    received = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+            if self.headers.get('Content-Encoding') == 'gzip':
+                body = gzip.decompress(body)
+            if len(received) < fail_first:
+                received.append(None)
+                self.send_response(503)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+            received.append(json.loads(body))
+            answer = json.dumps({'status': 'ok'}).encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(answer)))
+            self.end_headers()
+            self.wfile.write(answer)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}/qgis-plugin-endpoint", received
+
+def check_notifier(count=20):
+    """Post notifications to a local stand-in service with the in-process notifier"""
+    import time
+    try:
+        from notifier import Notifier
+    except ImportError as e:
+        print(f"❌ Import error: {e}")
+        return False
+
+    server, url, received = start_stand_in_service(fail_first=1)
+    notifier = Notifier(url, retries=3, backoff=0.05)
+    try:
+        timings = []
+        for n in range(count):
+            payload = {'application_number': f'APP{n:04d}', 'lga_name': 'Test LGA',
+                       'block_number': '1', 'parcel_number': str(n + 1)}
+            start_time = time.perf_counter()
+            notifier.send(payload).result()
+            timings.append(time.perf_counter() - start_time)
+    finally:
+        notifier.close()
+        server.shutdown()
+
+    delivered = [payload for payload in received if payload]
+    print(f"✓ {len(delivered)} of {count} notifications delivered ({len(received) - len(delivered)} retried after 503)")
+    print(f"   First (with retry): {timings[0] * 1000:.1f} ms")
+    print(f"   Following, pooled:  {sum(timings[1:]) / max(1, len(timings) - 1) * 1000:.2f} ms each")
+
+    # One notification carrying the UPI of 300 parcels, gzip compressed
+    import gzip
+    import json
+    server, url, received = start_stand_in_service(fail_first=0)
+    notifier = Notifier(url, compress=True)
+    upis = [[f'P{n:03d}', 'Test LGA', 1, 1 + n // 100, n + 1] for n in range(300)]
+    payload = {'application_number': 'APP0000', 'lga_name': 'Test LGA', 'block_number': '1', 'parcel_number': '1',
+               'upi_columns': ['parcel_id', 'lga_name', 'lga_num', 'block_num', 'parcel_num'], 'upis': upis}
+    try:
+        notifier.post(payload)
+    finally:
+        notifier.close()
+        server.shutdown()
+    body = json.dumps(payload, separators=(',', ':')).encode()
+    print(f"   300 parcel UPIs in one request: {len(body)} bytes JSON, {len(gzip.compress(body))} bytes gzip")
+    return len(delivered) == count and received == [payload]
+
 def show_development_menu():
     """Show development menu"""
     print("\n" + "="*50)
@@ -83,10 +374,17 @@ def show_development_menu():
     print("1. Test plugin functionality")
     print("2. Create test CSV file")
     print("3. Show plugin info")
-    print("4. Exit")
+    print("4. Traverse a CSV file (headless)")
+    print("5. Measure plugin import time")
+    print("6. Check a CSV file for all errors (dry run)")
+    print("7. Benchmark beacon feature building (50k beacons)")
+    print("8. Send test notifications to a local stand-in service")
+    print("9. Check traverse closures on test data")
+    print("10. Check parcel numbering for a parcel outside every block")
+    print("11. Exit")
     print("="*50)
     
-    choice = input("Select option (1-4): ").strip()
+    choice = input("Select option (1-11): ").strip()
     
     if choice == "1":
         test_plugin_functionality()
@@ -95,6 +393,20 @@ def show_development_menu():
     elif choice == "3":
         show_plugin_info()
     elif choice == "4":
+        run_traverse_engine()
+    elif choice == "5":
+        measure_import_time()
+    elif choice == "6":
+        check_csv()
+    elif choice == "7":
+        benchmark_feature_building()
+    elif choice == "8":
+        check_notifier()
+    elif choice == "9":
+        check_closures()
+    elif choice == "10":
+        check_unmatched_parcels()
+    elif choice == "11":
         print("👋 Goodbye!")
         return False
     else:
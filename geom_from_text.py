@@ -26,32 +26,18 @@ from qgis.PyQt.QtGui import QIcon
 from qgis.PyQt.QtWidgets import QAction, QMessageBox
 from qgis.core import (QgsVectorLayer,
                        QgsMapLayer,
-                       QgsFeature,
-                       QgsDataSourceUri,
-                       QgsGeometry,
-                       QgsPointXY,
                        QgsProject,
-                       QgsCoordinateTransform,
-                       QgsCoordinateReferenceSystem,
                        Qgis,
-                       QgsVectorLayerUtils,
-                       QgsFillSymbol,
-                       QgsFeatureRequest,
-                       QgsMessageLog)
-from qgis import processing
-import configparser
-from PyQt5.QtCore import QDate
+                       QgsFillSymbol)
 import sys
-import subprocess
-from qgis.PyQt.QtCore import QThread
-from .processing_worker import GeomFromTextWorker
 
 # Initialize Qt resources from file resources.py
 from .resources import *
-# Import the code for the dialog
-from .geom_from_text_dialog import GeomFromTextDialog, GeomFromTextReview
 import os.path
 
+# OPTIMIZED: The dialogs, the worker (NumPy, psycopg2, processing) and the
+# database session are only imported on the first run(), not at QGIS startup
+
 class GeomFromTextOptimized:
     """QGIS Plugin Implementation."""
 
@@ -79,6 +65,11 @@ class GeomFromTextOptimized:
             self.translator.load(locale_path)
             QCoreApplication.installTranslator(self.translator)
 
+        # Database session reused by every run of the worker, created on first run
+        self.registry = None
+        # Background write of an approved plan, while one is running
+        self.commit_worker = None
+
         # Declare instance attributes
         self.actions = []
         self.menu = self.tr(u'&Geom from Text')
@@ -198,6 +189,21 @@ class GeomFromTextOptimized:
                 self.tr(u'&Geom from Text'),
                 action)
             self.iface.removeToolBarIcon(action)
+        if self.registry:
+            self.registry.invalidate()
+        # Stop the geometry worker processes if a run started them
+        parallel_geometry = sys.modules.get(f'{__package__}.parallel_geometry')
+        if parallel_geometry:
+            parallel_geometry.shutdown()
+        outbox = sys.modules.get(f'{__package__}.outbox')
+        if outbox:
+            outbox.shutdown()
+        notifier = sys.modules.get(f'{__package__}.notifier')
+        if notifier:
+            notifier.shutdown()
+        # A write still running is rolled back rather than outliving the plugin
+        if self.commit_worker:
+            self.commit_worker.cancel()
 
     def on_progress_message(self, message):
         """Handle progress messages from the worker"""
@@ -208,10 +214,19 @@ class GeomFromTextOptimized:
     def run(self):
         """Run method that performs all the real work"""
 
+        # A new submission would replace the running write's result and reset
+        # the lga/blocks filters on layers the commit thread is still using
+        if self.commit_worker:
+            self.iface.messageBar().pushMessage('Warning', 'Still adding the previous parcels, please wait', level=Qgis.Warning, duration=3)
+            return
+
         if self.first_start == True:
             self.first_start = False
+            from .geom_from_text_dialog import GeomFromTextDialog, GeomFromTextReview
+            from .db_session import LayerRegistry
             self.dlg = GeomFromTextDialog()
             self.dlgRev = GeomFromTextReview()
+            self.registry = LayerRegistry(self.plugin_dir)
 
         self.dlg.setWindowFlags(Qt.WindowStaysOnTopHint)
         self.dlg.show()
@@ -229,8 +244,9 @@ class GeomFromTextOptimized:
             self.iface.mainWindow().setCursor(Qt.WaitCursor)
 
             # --- Start worker in a QThread ---
+            from .processing_worker import GeomFromTextWorker
             self.thread = QThread()
-            self.worker = GeomFromTextWorker(csv_path, epsg, app_num, self.plugin_dir)
+            self.worker = GeomFromTextWorker(csv_path, epsg, app_num, self.plugin_dir, self.registry)
             self.worker.moveToThread(self.thread)
             self.thread.started.connect(self.worker.run)
             self.worker.finished.connect(self.on_worker_finished)
@@ -257,25 +273,8 @@ class GeomFromTextOptimized:
         # --- Handle result ---
         if result.get('success'):
             # Review dialog and feature approval workflow
-            parcels_feats = result['parcels_feats']
-            beacons_feats = result['beacons_feats']
-            roads_feats = result['roads_feats']
-            beacons_dict = result['beacons_dict']
-            roads_dict = result['roads_dict']
-            lga = result['lga']
-            blocks = result['blocks']
+            plan = result['plan']
             parcels = result['parcels']
-            beacons = result['beacons']
-            roads = result['roads']
-            parcel_lkp = result['parcel_lkp']
-            lga_num = result['lga_num']
-            block_num = result['block_num']
-            parcel_num = result['parcel_num']
-            data_source = result['data_source']
-            status = result['status']
-            app_num = result['app_num']
-            plugin_dir = result['plugin_dir']
-            parcel_id_list = result['parcel_id_list']
             
             # OPTIMIZED: Batch review - create single memory layer for all parcels
             self.iface.messageBar().pushMessage('Info', 'Creating review layer...', level=Qgis.Info, duration=2)
@@ -292,6 +291,8 @@ class GeomFromTextOptimized:
             review_lyr.updateFields()
             
             # BATCH ADD: Add all parcels at once to the review layer
+            # (parcel features are built here from the worker's compact plan)
+            parcels_feats = plan.parcel_features(fields)
             review_lyr.dataProvider().addFeatures(parcels_feats)
             
             # Set styling for review layer
@@ -314,6 +315,7 @@ class GeomFromTextOptimized:
             canvas.refresh()
             
             # Show review dialog
+            self.dlgRev.set_review_layer(review_lyr, self.iface)
             self.dlgRev.setWindowFlags(Qt.WindowStaysOnTopHint)
             self.dlgRev.show()
             result_dialog = self.dlgRev.exec_()
@@ -323,179 +325,86 @@ class GeomFromTextOptimized:
             canvas.refresh()
             
             if result_dialog:
-                # User approved - proceed with adding to main layers
-                self.iface.messageBar().pushMessage('Info', 'Adding parcels to database...', level=Qgis.Info, duration=2)
-                
-                # Add parcels to database first
-                new_parcels = parcels.dataProvider().addFeatures(parcels_feats)[1]
-                new_ids = [feat.id() for feat in new_parcels]
-                
-                # OPTIMIZED: Log the feature IDs for debugging
-                self.iface.messageBar().pushMessage('Info', f'Added {len(new_parcels)} parcels with IDs: {new_ids}', level=Qgis.Info, duration=3)
-                
-                # OPTIMIZED: Batch parcel numbering operations
-                self.iface.messageBar().pushMessage('Info', 'Assigning parcel numbers...', level=Qgis.Info, duration=2)
-                
-                parcels.select(new_ids)
-                parcels.startEditing()
-                parcels_fields = parcels.fields()
-                
-                # Collect all LGA/block combinations to process in batch
-                lga_block_combinations = set()
-                for feat in parcels.selectedFeatures():
-                    lga_block_combinations.add((feat['lga_num'], feat['block_num']))
-                
-                # Batch query and update parcel lookup table
-                parcel_lkp.startEditing()
-                
-                # Process each unique LGA/block combination
-                for lga_num, block_num in lga_block_combinations:
-                    expression = f'("block_num" = {block_num}) AND ("lga_num" = {lga_num})'
-                    parcel_lkp.selectByExpression(expression)
-                    
-                    if parcel_lkp.selectedFeatures():
-                        # Update existing counter
-                        counter = parcel_lkp.selectedFeatures()[0]
-                        parcel_count = counter['parcel_count'] + 1
-                        parcel_lkp.removeSelection()
-                        counter['parcel_count'] = parcel_count
-                        parcel_lkp.updateFeature(counter)
-                    else:
-                        # Create new counter
-                        parcel_count = 1
-                        fields = parcel_lkp.fields()
-                        counter = QgsFeature(fields)
-                        counter.setAttribute(fields.indexFromName('lga_num'), lga_num)
-                        counter.setAttribute(fields.indexFromName('block_num'), block_num)
-                        counter.setAttribute(fields.indexFromName('parcel_count'), parcel_count)
-                        parcel_lkp.addFeature(counter)
-                
-                # Single commit for all parcel lookup changes
-                parcel_lkp.commitChanges()
-                
-                # OPTIMIZED: Preserve parcel numbers from worker, don't overwrite them
-                # The parcel numbers were already set correctly in processing_worker.py
-                # We don't need to query the lookup table for parcel numbers
-                
-                # Get the parcel numbers that were already set in the worker
-                parcel_nums = []
-                for feat in parcels.selectedFeatures():
-                    parcel_num = feat['parcel_num']  # Use the value already set in worker
-                    parcel_nums.append(parcel_num)
-                    self.iface.messageBar().pushMessage('Info', f'Preserved parcel_num={parcel_num} for feature {feat.id()}', level=Qgis.Info, duration=2)
-                
-                # Single commit for all parcel changes (no changes needed, just commit)
-                parcels.commitChanges()
-                
-                # Get the updated values
-                lga_nums = QgsVectorLayerUtils.getValues(parcels, 'lga_num', selectedOnly=True)[0]
-                block_nums = QgsVectorLayerUtils.getValues(parcels, 'block_num', selectedOnly=True)[0]
-                parcels.removeSelection()
-                
-                parcel_ids = list(beacons_dict.keys())
-                upi_dict = dict(zip(parcel_ids, zip(lga_nums, block_nums, parcel_nums)))
-                
-                # OPTIMIZED: Add defensive logging for upi_dict
-                self.iface.messageBar().pushMessage('Info', f'UPI dict contains {len(upi_dict)} entries', level=Qgis.Info, duration=2)
-                
-                # Collect all roads and beacons for batch processing
-                all_roads = []
-                all_beacons = []
-                
-                for k in roads_dict:
-                    # OPTIMIZED: Defensive coding for missing keys
-                    if k in upi_dict:
-                        lga_val = upi_dict[k][0]
-                        block_val = upi_dict[k][1]
-                        parcel_val = upi_dict[k][2]
-                    else:
-                        # Set default values for missing keys
-                        self.iface.messageBar().pushMessage('Warning', f'Missing UPI data for parcel {k}, using defaults', level=Qgis.Warning, duration=3)
-                        lga_val = 999
-                        block_val = 999
-                        parcel_val = 999
-                    
-                    # Process all features for this parcel
-                    for feat in roads_dict[k]:
-                        feat['lga_num'] = lga_val
-                        feat['block_num'] = block_val
-                        feat['parcel_num'] = parcel_val
-                        all_roads.append(feat)
-                
-                for k in beacons_dict:
-                    # OPTIMIZED: Defensive coding for missing keys
-                    if k in upi_dict:
-                        lga_val = upi_dict[k][0]
-                        block_val = upi_dict[k][1]
-                        parcel_val = upi_dict[k][2]
-                    else:
-                        # Set default values for missing keys
-                        self.iface.messageBar().pushMessage('Warning', f'Missing UPI data for parcel {k}, using defaults', level=Qgis.Warning, duration=3)
-                        lga_val = 999
-                        block_val = 999
-                        parcel_val = 999
-                    
-                    # Process all features for this parcel
-                    for feat in beacons_dict[k]:
-                        feat['lga_num'] = lga_val
-                        feat['block_num'] = block_val
-                        feat['parcel_num'] = parcel_val
-                        all_beacons.append(feat)
-                
-                # Batch add all roads and beacons at once
-                roads.dataProvider().addFeatures(all_roads)
-                beacons.dataProvider().addFeatures(all_beacons)
-                
-                # OPTIMIZED: Robust zoom to features using unique attributes
-                if new_ids:
-                    try:
-                        # Get the parcel numbers for the newly added features
-                        parcel_nums = []
-                        for feat in parcels.selectedFeatures():
-                            parcel_num = feat['parcel_num']
-                            parcel_nums.append(parcel_num)
-                        
-                        parcels.removeSelection()  # Clear selection first
-                        
-                        # Query features by parcel_num (unique attribute) for reliable zoom
-                        all_found_ids = []
-                        for parcel_num in parcel_nums:
-                            expr = f'"parcel_num" = {parcel_num}'
-                            request = QgsFeatureRequest().setFilterExpression(expr)
-                            found_ids = [f.id() for f in parcels.getFeatures(request)]
-                            all_found_ids.extend(found_ids)
-                        
-                        if all_found_ids:
-                            # Select and zoom to the found features
-                            parcels.selectByIds(all_found_ids)
-                            canvas.zoomToFeatureIds(parcels, all_found_ids)
-                            self.iface.messageBar().pushMessage('Info', f'Zoomed to {len(all_found_ids)} features with parcel_nums: {parcel_nums}', level=Qgis.Info, duration=3)
-                        else:
-                            self.iface.messageBar().pushMessage('Warning', f'No features found for parcel_nums: {parcel_nums}', level=Qgis.Warning, duration=3)
-                            
-                    except Exception as e:
-                        self.iface.messageBar().pushMessage('Warning', f'Zoom failed: {str(e)}', level=Qgis.Warning, duration=3)
-                else:
-                    self.iface.messageBar().pushMessage('Warning', 'No new parcel IDs to zoom to', level=Qgis.Warning, duration=3)
-                
-                req = QgsFeatureRequest().setFilterExpression(f'"lga_num" = {lga_num}')
-                lga_name = None
-                for feat in lga.getFeatures(req):
-                    lga_name = feat['lga_name']
-                send_request_path = os.path.join(plugin_dir, 'send_request.py')
-                qgis_base_dir = os.path.dirname(sys.executable)
-                qgis_python_path = os.path.join(qgis_base_dir, 'python.exe')
-                send_request_cmd = [qgis_python_path, send_request_path, app_num, lga_name, str(block_num), str(parcel_num)]
-                try:
-                    import subprocess
-                    subprocess.run(send_request_cmd, check=True)
-                except Exception as e:
-                    QMessageBox.warning(self.iface.mainWindow(), 'Warning', f'Failed to send Application No. {app_num}\nUnexpected error occurred:\n{str(e)}')
-                msg = 'A new parcel has been added to the layer' if len(new_parcels) == 1 else f'{len(new_parcels)} new parcels have been added to the layer'
-                self.iface.messageBar().pushMessage('Done', msg, level=Qgis.Success, duration=3)
+                # User approved - write in the background, QGIS stays responsive
+                self.start_commit(result)
             else:
                 # User disapproved
                 QMessageBox.critical(self.iface.mainWindow(), 'Error', 'Parcels disapproved by user')
                 self.iface.messageBar().pushMessage('Error', 'Failed to add new parcels', level=Qgis.Critical, duration=3)
         else:
-            QMessageBox.critical(self.iface.mainWindow(), 'Error', result.get('error', 'Unknown error'))
\ No newline at end of file
+            QMessageBox.critical(self.iface.mainWindow(), 'Error', result.get('error', 'Unknown error'))
+
+    def start_commit(self, result):
+        """Write an approved plan on a CommitWorker thread, with a Cancel button"""
+        from qgis.PyQt.QtWidgets import QPushButton
+        from .commit_worker import CommitWorker
+        self.commit_result = result
+        self.commit_thread = QThread()
+        self.commit_worker = CommitWorker(result)
+        self.commit_worker.moveToThread(self.commit_thread)
+        self.commit_thread.started.connect(self.commit_worker.run)
+        self.commit_worker.finished.connect(self.on_commit_finished)
+        self.commit_worker.finished.connect(self.commit_thread.quit)
+        self.commit_worker.finished.connect(self.commit_worker.deleteLater)
+        self.commit_thread.finished.connect(self.commit_thread.deleteLater)
+        self.commit_worker.progress.connect(self.on_progress_message)
+
+        self.commit_message = self.iface.messageBar().createMessage('Info', 'Adding parcels to database...')
+        cancel_button = QPushButton('Cancel')
+        # A bound slot of the moved worker would be queued behind run() on the
+        # commit thread; the lambda calls cancel() right away on the GUI thread
+        worker = self.commit_worker
+        cancel_button.clicked.connect(lambda: worker.cancel())
+        self.commit_message.layout().addWidget(cancel_button)
+        self.iface.messageBar().pushWidget(self.commit_message, Qgis.Info)
+
+        self.commit_thread.start()
+
+    def on_commit_finished(self, outcome):
+        """Zoom to the new parcels and report the write started in start_commit"""
+        try:
+            self.iface.messageBar().popWidget(self.commit_message)
+        except RuntimeError:
+            pass  # Already closed by the user
+        result = self.commit_result
+        self.commit_result = None
+        self.commit_worker = None
+
+        if outcome.get('cancelled'):
+            if outcome.get('written'):
+                QMessageBox.warning(self.iface.mainWindow(), 'Warning', 'Cancelled after the parcels were written, please check the roads and beacons')
+            else:
+                self.iface.messageBar().pushMessage('Warning', 'Cancelled, no parcels were added', level=Qgis.Warning, duration=3)
+            return
+        if not outcome.get('success'):
+            QMessageBox.critical(self.iface.mainWindow(), 'Error', f"Adding the parcels failed:\n{outcome.get('error', 'Unknown error')}")
+            return
+
+        new_ids = outcome['new_ids']
+        canvas = self.iface.mapCanvas()
+        # OPTIMIZED: The worker returns the new ids, only the zoom runs here
+        if new_ids:
+            try:
+                from .parcel_zoom import existing_ids, find_parcels_layer, select_and_zoom
+                # The worker's parcels layer only loads the schema, zoom on the project's
+                parcels = find_parcels_layer()
+                if parcels is None:
+                    parcels = result['parcels']
+                # Rows written on the worker's connection are not in the layer cache yet
+                parcels.dataProvider().reloadData()
+                # OPTIMIZED: One id-only request for all new parcels
+                found_ids = existing_ids(parcels, new_ids)
+                if found_ids:
+                    select_and_zoom(canvas, parcels, found_ids)
+                    self.iface.messageBar().pushMessage('Info', f'Zoomed to {len(found_ids)} new parcels', level=Qgis.Info, duration=3)
+                else:
+                    self.iface.messageBar().pushMessage('Warning', f'No features found for the {len(new_ids)} new parcel IDs', level=Qgis.Warning, duration=3)
+            except Exception as e:
+                self.iface.messageBar().pushMessage('Warning', f'Zoom failed: {str(e)}', level=Qgis.Warning, duration=3)
+        else:
+            self.iface.messageBar().pushMessage('Warning', 'No new parcel IDs to zoom to', level=Qgis.Warning, duration=3)
+
+        if outcome.get('notify_error'):
+            QMessageBox.warning(self.iface.mainWindow(), 'Warning', f"Failed to send Application No. {result['app_num']}\nUnexpected error occurred:\n{outcome['notify_error']}")
+        msg = 'A new parcel has been added to the layer' if len(new_ids) == 1 else f'{len(new_ids)} new parcels have been added to the layer'
+        self.iface.messageBar().pushMessage('Done', msg, level=Qgis.Success, duration=3)
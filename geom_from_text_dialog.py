@@ -22,14 +22,11 @@
  ***************************************************************************/
 """
 
-import os
-
-from qgis.PyQt import uic
 from qgis.PyQt import QtWidgets
 
-# load 1st ui file for the csv input
-FORM_CLASS, _ = uic.loadUiType(os.path.join(
-    os.path.dirname(__file__), 'geom_from_text_dialog_base.ui'))
+# 1st ui file for the csv input, precompiled with
+# pyuic5 -o geom_from_text_dialog_base_ui.py geom_from_text_dialog_base.ui
+from .geom_from_text_dialog_base_ui import Ui_GeomFromTextDialogBase as FORM_CLASS
 
 class GeomFromTextDialog(QtWidgets.QDialog, FORM_CLASS):
     def __init__(self, parent=None):
@@ -56,9 +53,9 @@ class GeomFromTextDialog(QtWidgets.QDialog, FORM_CLASS):
         # highlight empty field
         self.ldt.setStyleSheet("" if text_filled else "border: 2px solid red;")
 
-# load 2nd ui file for the parcel review dialog
-FORM_CLASS1, _ = uic.loadUiType(os.path.join(
-    os.path.dirname(__file__), 'geom_from_text_dialog_review.ui'))
+# 2nd ui file for the parcel review dialog, precompiled with
+# pyuic5 -o geom_from_text_dialog_review_ui.py geom_from_text_dialog_review.ui
+from .geom_from_text_dialog_review_ui import Ui_dlgReview as FORM_CLASS1
 
 class GeomFromTextReview(QtWidgets.QDialog, FORM_CLASS1):
     def __init__(self, parent=None):
@@ -69,85 +66,54 @@ class GeomFromTextReview(QtWidgets.QDialog, FORM_CLASS1):
         # Connect the zoom button to zoom functionality
         self.btnZoom.clicked.connect(self.zoom_to_parcels)
         self.review_layer = None  # Will be set by the main plugin
+        self.iface = None
         
-    def set_review_layer(self, layer):
+    def set_review_layer(self, layer, iface=None):
         """Set the review layer to zoom to."""
         self.review_layer = layer
+        if iface is not None:
+            self.iface = iface
         
     def zoom_to_parcels(self):
-        """Zoom to the parcels in the review layer using robust querying."""
+        """Zoom to the parcels in the review layer with a single query."""
+        from qgis import Qgis
+        from .parcel_zoom import find_parcels_layer, ids_for_parcel_nums, select_and_zoom
+
+        iface = self.iface or getattr(self.parent(), 'iface', None)
+        canvas = iface.mapCanvas() if iface else None
+        if not canvas:
+            print("Canvas not available for zooming")
+            return
+        if not (self.review_layer and self.review_layer.isValid()):
+            print("Review layer not available for zooming")
+            return
+
+        def zoom_to_review_layer(message):
+            canvas.setExtent(self.review_layer.extent().scaled(1.2))
+            canvas.refresh()
+            iface.messageBar().pushMessage('Info', message, level=Qgis.Info, duration=2)
+
         try:
-            from qgis.core import QgsProject, QgsFeatureRequest
-            from qgis import Qgis
-            
-            # Get the main parcels layer from the project
-            parcels_layer = None
-            for layer in QgsProject.instance().mapLayers().values():
-                if layer.name() == 'parcels' and layer.geometryType() == 2:  # Polygon layer
-                    parcels_layer = layer
-                    break
-            
-            if not parcels_layer:
-                # Fallback: try to find any polygon layer that might be parcels
-                for layer in QgsProject.instance().mapLayers().values():
-                    if layer.geometryType() == 2 and 'parcel' in layer.name().lower():
-                        parcels_layer = layer
-                        break
-            
+            # OPTIMIZED: Cached layer lookup and one IN (...) query for all parcel numbers
+            parcels_layer = find_parcels_layer()
             if not parcels_layer:
                 print("No parcels layer found for zooming")
                 return
-            
-            # Get the canvas
-            canvas = self.parent().iface.mapCanvas() if hasattr(self.parent(), 'iface') else None
-            if not canvas:
-                print("Canvas not available for zooming")
+
+            parcel_nums = [feature['parcel_num'] for feature in self.review_layer.getFeatures()]
+            parcel_nums = [n for n in parcel_nums if n]
+            if not parcel_nums:
+                zoom_to_review_layer('Zoomed to review layer extent')
                 return
-            
-            # Query for all features in the review layer to get their parcel numbers
-            if self.review_layer and self.review_layer.isValid():
-                parcel_nums = []
-                for feature in self.review_layer.getFeatures():
-                    parcel_num = feature['parcel_num']
-                    if parcel_num:
-                        parcel_nums.append(parcel_num)
-                
-                if parcel_nums:
-                    # Query the main parcels layer for these parcel numbers
-                    all_found_ids = []
-                    for parcel_num in parcel_nums:
-                        expr = f'"parcel_num" = {parcel_num}'
-                        request = QgsFeatureRequest().setFilterExpression(expr)
-                        found_ids = [f.id() for f in parcels_layer.getFeatures(request)]
-                        all_found_ids.extend(found_ids)
-                    
-                    if all_found_ids:
-                        # Select and zoom to the found features
-                        parcels_layer.selectByIds(all_found_ids)
-                        canvas.zoomToFeatureIds(parcels_layer, all_found_ids)
-                        self.parent().iface.messageBar().pushMessage('Info', f'Zoomed to {len(all_found_ids)} parcels with parcel_nums: {parcel_nums}', level=Qgis.Info, duration=3)
-                    else:
-                        # Fallback: zoom to review layer extent
-                        canvas.setExtent(self.review_layer.extent().scaled(1.2))
-                        canvas.refresh()
-                        self.parent().iface.messageBar().pushMessage('Info', 'Zoomed to review layer extent (fallback)', level=Qgis.Info, duration=2)
-                else:
-                    # No parcel numbers found, zoom to review layer extent
-                    canvas.setExtent(self.review_layer.extent().scaled(1.2))
-                    canvas.refresh()
-                    self.parent().iface.messageBar().pushMessage('Info', 'Zoomed to review layer extent', level=Qgis.Info, duration=2)
+            found_ids = ids_for_parcel_nums(parcels_layer, parcel_nums)
+            if found_ids:
+                select_and_zoom(canvas, parcels_layer, found_ids)
+                iface.messageBar().pushMessage('Info', f'Zoomed to {len(found_ids)} parcels with parcel_nums: {parcel_nums}', level=Qgis.Info, duration=3)
             else:
-                print("Review layer not available for zooming")
-                
+                zoom_to_review_layer('Zoomed to review layer extent (fallback)')
         except Exception as e:
             print(f"Error zooming to parcels: {str(e)}")
-            # Fallback: try to zoom to review layer if available
-            if self.review_layer and self.review_layer.isValid():
-                try:
-                    canvas = self.parent().iface.mapCanvas() if hasattr(self.parent(), 'iface') else None
-                    if canvas:
-                        canvas.setExtent(self.review_layer.extent().scaled(1.2))
-                        canvas.refresh()
-                        self.parent().iface.messageBar().pushMessage('Info', 'Zoomed to review layer (error fallback)', level=Qgis.Info, duration=2)
-                except:
-                    pass
+            try:
+                zoom_to_review_layer('Zoomed to review layer (error fallback)')
+            except Exception:
+                pass
@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+
+# Form implementation generated from reading ui file 'geom_from_text_dialog_base.ui'
+#
+# Created by: PyQt5 UI code generator 5.15.9
+#
+# WARNING: Any manual changes made to this file will be lost when pyuic5 is
+# run again.  Do not edit this file unless you know what you are doing.
+
+
+from qgis.PyQt import QtCore, QtGui, QtWidgets
+
+
+class Ui_GeomFromTextDialogBase(object):
+    def setupUi(self, GeomFromTextDialogBase):
+        GeomFromTextDialogBase.setObjectName("GeomFromTextDialogBase")
+        GeomFromTextDialogBase.resize(522, 192)
+        GeomFromTextDialogBase.setMinimumSize(QtCore.QSize(522, 192))
+        GeomFromTextDialogBase.setMaximumSize(QtCore.QSize(522, 192))
+        GeomFromTextDialogBase.setModal(True)
+        self.button_box = QtWidgets.QDialogButtonBox(GeomFromTextDialogBase)
+        self.button_box.setGeometry(QtCore.QRect(330, 152, 171, 32))
+        self.button_box.setOrientation(QtCore.Qt.Horizontal)
+        self.button_box.setStandardButtons(QtWidgets.QDialogButtonBox.Cancel|QtWidgets.QDialogButtonBox.Ok)
+        self.button_box.setObjectName("button_box")
+        self.qfw = QgsFileWidget(GeomFromTextDialogBase)
+        self.qfw.setGeometry(QtCore.QRect(20, 40, 481, 27))
+        self.qfw.setLocale(QtCore.QLocale(QtCore.QLocale.English, QtCore.QLocale.Nigeria))
+        self.qfw.setObjectName("qfw")
+        self.qfw_label = QtWidgets.QLabel(GeomFromTextDialogBase)
+        self.qfw_label.setGeometry(QtCore.QRect(20, 12, 81, 21))
+        self.qfw_label.setLocale(QtCore.QLocale(QtCore.QLocale.English, QtCore.QLocale.Nigeria))
+        self.qfw_label.setObjectName("qfw_label")
+        self.cmb = QtWidgets.QComboBox(GeomFromTextDialogBase)
+        self.cmb.setGeometry(QtCore.QRect(20, 111, 261, 25))
+        self.cmb.setLocale(QtCore.QLocale(QtCore.QLocale.English, QtCore.QLocale.Nigeria))
+        self.cmb.setEditable(False)
+        self.cmb.setSizeAdjustPolicy(QtWidgets.QComboBox.AdjustToContentsOnFirstShow)
+        self.cmb.setObjectName("cmb")
+        self.cmb.addItem("")
+        self.cmb.addItem("")
+        self.cmb.addItem("")
+        self.cmb_label = QtWidgets.QLabel(GeomFromTextDialogBase)
+        self.cmb_label.setGeometry(QtCore.QRect(20, 77, 131, 31))
+        self.cmb_label.setLocale(QtCore.QLocale(QtCore.QLocale.English, QtCore.QLocale.Nigeria))
+        self.cmb_label.setObjectName("cmb_label")
+        self.ldt = QtWidgets.QLineEdit(GeomFromTextDialogBase)
+        self.ldt.setGeometry(QtCore.QRect(300, 111, 201, 25))
+        self.ldt.setLocale(QtCore.QLocale(QtCore.QLocale.English, QtCore.QLocale.Nigeria))
+        self.ldt.setText("")
+        self.ldt.setPlaceholderText("")
+        self.ldt.setObjectName("ldt")
+        self.ldt_label = QtWidgets.QLabel(GeomFromTextDialogBase)
+        self.ldt_label.setGeometry(QtCore.QRect(300, 77, 111, 31))
+        self.ldt_label.setLocale(QtCore.QLocale(QtCore.QLocale.English, QtCore.QLocale.Nigeria))
+        self.ldt_label.setObjectName("ldt_label")
+
+        self.retranslateUi(GeomFromTextDialogBase)
+        self.button_box.accepted.connect(GeomFromTextDialogBase.accept) # type: ignore
+        self.button_box.rejected.connect(GeomFromTextDialogBase.reject) # type: ignore
+        QtCore.QMetaObject.connectSlotsByName(GeomFromTextDialogBase)
+
+    def retranslateUi(self, GeomFromTextDialogBase):
+        _translate = QtCore.QCoreApplication.translate
+        GeomFromTextDialogBase.setWindowTitle(_translate("GeomFromTextDialogBase", "Geom from Text"))
+        self.qfw.setDialogTitle(_translate("GeomFromTextDialogBase", "Open file"))
+        self.qfw.setFilter(_translate("GeomFromTextDialogBase", "CSV files (*.csv)"))
+        self.qfw_label.setText(_translate("GeomFromTextDialogBase", "Select CSV file"))
+        self.cmb.setItemText(0, _translate("GeomFromTextDialogBase", "Minna / UTM zone 31N"))
+        self.cmb.setItemText(1, _translate("GeomFromTextDialogBase", "Minna / Nigeria West Belt (NNO)"))
+        self.cmb.setItemText(2, _translate("GeomFromTextDialogBase", "WGS 84 / UTM zone 31N"))
+        self.cmb_label.setText(_translate("GeomFromTextDialogBase", "Select input CRS"))
+        self.ldt_label.setText(_translate("GeomFromTextDialogBase", "Application No."))
+from qgis.gui import QgsFileWidget
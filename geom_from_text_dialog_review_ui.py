@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+
+# Form implementation generated from reading ui file 'geom_from_text_dialog_review.ui'
+#
+# Created by: PyQt5 UI code generator 5.15.9
+#
+# WARNING: Any manual changes made to this file will be lost when pyuic5 is
+# run again.  Do not edit this file unless you know what you are doing.
+
+
+from qgis.PyQt import QtCore, QtGui, QtWidgets
+
+
+class Ui_dlgReview(object):
+    def setupUi(self, dlgReview):
+        dlgReview.setObjectName("dlgReview")
+        dlgReview.setWindowModality(QtCore.Qt.NonModal)
+        dlgReview.resize(372, 112)
+        sizePolicy = QtWidgets.QSizePolicy(QtWidgets.QSizePolicy.Fixed, QtWidgets.QSizePolicy.Fixed)
+        sizePolicy.setHorizontalStretch(0)
+        sizePolicy.setVerticalStretch(0)
+        sizePolicy.setHeightForWidth(dlgReview.sizePolicy().hasHeightForWidth())
+        dlgReview.setSizePolicy(sizePolicy)
+        dlgReview.setMinimumSize(QtCore.QSize(372, 112))
+        dlgReview.setMaximumSize(QtCore.QSize(372, 112))
+        self.label = QtWidgets.QLabel(dlgReview)
+        self.label.setGeometry(QtCore.QRect(20, 22, 271, 19))
+        self.label.setObjectName("label")
+        self.btnYes = QtWidgets.QPushButton(dlgReview)
+        self.btnYes.setGeometry(QtCore.QRect(180, 73, 81, 27))
+        self.btnYes.setObjectName("btnYes")
+        self.btnNo = QtWidgets.QPushButton(dlgReview)
+        self.btnNo.setGeometry(QtCore.QRect(270, 73, 81, 27))
+        self.btnNo.setObjectName("btnNo")
+        self.btnZoom = QtWidgets.QPushButton(dlgReview)
+        self.btnZoom.setGeometry(QtCore.QRect(20, 73, 101, 27))
+        self.btnZoom.setObjectName("btnZoom")
+
+        self.retranslateUi(dlgReview)
+        self.btnYes.clicked.connect(dlgReview.accept) # type: ignore
+        self.btnNo.clicked.connect(dlgReview.reject) # type: ignore
+        QtCore.QMetaObject.connectSlotsByName(dlgReview)
+
+    def retranslateUi(self, dlgReview):
+        _translate = QtCore.QCoreApplication.translate
+        dlgReview.setWindowTitle(_translate("dlgReview", "Parcels review"))
+        self.label.setText(_translate("dlgReview", "Do you approve the following parcel?"))
+        self.btnYes.setText(_translate("dlgReview", "Yes"))
+        self.btnNo.setText(_translate("dlgReview", "No"))
+        self.btnZoom.setText(_translate("dlgReview", "Zoom parcel"))
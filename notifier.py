@@ -0,0 +1,179 @@
+# -*- coding: utf-8 -*-
+"""
+In-process notifications to the ``[SERVICE] EndPoint`` web service.
+
+After every commit the plugin used to start a new QGIS ``python.exe`` for
+send_request.py, which imported requests, set up logging and read
+config.ini again to POST four fields, while the GUI waited on
+``subprocess.run``. Notifier keeps all of that in the QGIS process:
+
+* one ``requests.Session`` for the plugin's lifetime, so the keep-alive
+  connection to the service is reused between submissions;
+* connect/read timeouts and retries with exponential backoff
+  (``[SERVICE]`` Timeout, Retries, RetryBackoff), only where the service
+  cannot have accepted the POST: connection errors and 503 answers, sent
+  with the same ``Idempotency-Key``. A slow answer is never re-posted
+  here; the outbox retries every other failure later;
+* posts run on a single background thread; send() returns a Future;
+* bodies are compact JSON, gzip compressed with ``[SERVICE] Compress``
+  (``Content-Encoding: gzip``) for services that accept it.
+
+Requests are logged to send_request.log like the script did. Payloads
+normally reach the notifier through the durable outbox (outbox.py).
+Nothing in here imports qgis, so the notifier can be exercised against a
+local stand-in server (dev_runner option 8).
+"""
+
+import gzip
+import json
+import logging
+import os
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from logging.handlers import RotatingFileHandler
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+LOG_FILE = os.path.join(os.path.dirname(__file__), 'send_request.log')
+
+# Answers meaning the request was not processed; anything else is returned
+# to the caller
+RETRY_STATUSES = (503,)
+
+_notifier = None
+_notifier_key = None
+_notifier_lock = threading.Lock()
+
+
+def get_logger():
+    logger = logging.getLogger('geom_from_text.notifier')
+    if not logger.handlers:
+        handler = RotatingFileHandler(LOG_FILE, maxBytes=5*1024*1024, backupCount=3)
+        handler.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s', '%d-%m-%Y %H:%M:%S'))
+        logger.addHandler(handler)
+        logger.setLevel(logging.INFO)
+        # QGIS has its own root handlers, keep the messages in our log only
+        logger.propagate = False
+    return logger
+
+
+# 4xx answers worth another try later; every other 4xx is final
+TRANSIENT_CLIENT_STATUSES = (408, 429)
+
+
+class NotifyError(Exception):
+    """Delivery failed; ``status`` is the HTTP status, None without an answer."""
+
+    def __init__(self, message, status=None):
+        super().__init__(message)
+        self.status = status
+
+    @property
+    def permanent(self):
+        """True when the service rejected the payload itself, retrying cannot help."""
+        return self.status is not None and 400 <= self.status < 500 and self.status not in TRANSIENT_CLIENT_STATUSES
+
+
+def _retry(retries, backoff):
+    """Retry for connection errors and RETRY_STATUSES only, never read errors.
+
+    ``allowed_methods`` is urllib3 >= 1.26; older releases call it
+    ``method_whitelist``.
+    """
+    options = dict(total=retries, connect=retries, read=0, status=retries, backoff_factor=backoff,
+                   status_forcelist=RETRY_STATUSES, raise_on_status=False)
+    try:
+        return Retry(allowed_methods=frozenset(['POST']), **options)
+    except TypeError:
+        return Retry(method_whitelist=frozenset(['POST']), **options)
+
+
+class Notifier:
+    """POSTs JSON payloads to ``end_point`` over a pooled keep-alive session."""
+
+    def __init__(self, end_point, connect_timeout=3.0, read_timeout=10.0, retries=3, backoff=0.5,
+                 compress=False):
+        self.end_point = end_point
+        self.compress = compress
+        self.timeout = (connect_timeout, read_timeout)
+        adapter = HTTPAdapter(max_retries=_retry(retries, backoff), pool_connections=1, pool_maxsize=2)
+        self.session = requests.Session()
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='notifier')
+        self.logger = get_logger()
+
+    def post(self, payload, end_point=None, key=None):
+        """POST ``payload`` as JSON and return the decoded answer (blocking).
+
+        ``end_point`` defaults to the notifier's. ``key`` is the
+        ``Idempotency-Key``; pass the same one for every attempt to deliver
+        one payload (the outbox keeps one per payload), a new one is made
+        otherwise. Raises NotifyError once
+        the retries are used up or the service answers with an error status.
+        """
+        body = json.dumps(payload, separators=(',', ':')).encode('utf-8')
+        # Same key on every retry of this POST, so the service can drop repeats
+        headers = {'Content-Type': 'application/json', 'Idempotency-Key': key or str(uuid.uuid4())}
+        if self.compress:
+            body = gzip.compress(body)
+            headers['Content-Encoding'] = 'gzip'
+        try:
+            response = self.session.post(end_point or self.end_point, data=body, headers=headers,
+                                         timeout=self.timeout)
+            response.raise_for_status()
+        except requests.exceptions.RequestException as e:
+            self.logger.error('Error sending request: %s', e)
+            response = getattr(e, 'response', None)
+            raise NotifyError(str(e), response.status_code if response is not None else None) from e
+        try:
+            answer = response.json()
+        except ValueError:
+            answer = response.text
+        self.logger.info('Request successful: %s', answer)
+        return answer
+
+    def send(self, payload):
+        """post() ``payload`` on the notifier thread; returns a Future."""
+        return self.executor.submit(self.post, payload)
+
+    def close(self):
+        self.executor.shutdown(wait=False)
+        self.session.close()
+
+
+def from_config(config):
+    """Notifier for the ``[SERVICE]`` section of config.ini."""
+    service = config['SERVICE']
+    return Notifier(service['EndPoint'].strip(),
+                    connect_timeout=service.getfloat('ConnectTimeout', fallback=3.0),
+                    read_timeout=service.getfloat('Timeout', fallback=10.0),
+                    retries=service.getint('Retries', fallback=3),
+                    backoff=service.getfloat('RetryBackoff', fallback=0.5),
+                    compress=service.getboolean('Compress', fallback=False))
+
+
+def get_notifier(config):
+    """Shared Notifier, rebuilt when the ``[SERVICE]`` settings change."""
+    global _notifier, _notifier_key
+    key = tuple(sorted(config['SERVICE'].items()))
+    with _notifier_lock:
+        if _notifier is None or _notifier_key != key:
+            if _notifier is not None:
+                _notifier.close()
+            _notifier = from_config(config)
+            _notifier_key = key
+        return _notifier
+
+
+def shutdown():
+    """Close the shared session and its thread, if any."""
+    global _notifier, _notifier_key
+    with _notifier_lock:
+        if _notifier is not None:
+            _notifier.close()
+        _notifier = None
+        _notifier_key = None
@@ -0,0 +1,309 @@
+# -*- coding: utf-8 -*-
+"""
+Durable outbox for web service notifications.
+
+A notification used to be posted once, right after the commit; when the
+service was slow or down send_request.py exited with an error, the plugin
+showed a warning and the notification was lost. Now every payload is
+first written to a SQLite outbox next to send_request.log, in its own
+transaction, and delivered from there:
+
+* put() stores payloads atomically; the commit never waits for the service;
+* drain() claims the oldest due payloads, posts them and deletes them once
+  the service accepted them. A claim pushes the rows' next attempt past a
+  lease in the same write transaction, so the drainer and send_request.py
+  (another process on the same file) never post the same row twice; rows
+  of a drainer that died are due again when the lease runs out. In batch mode (``[SERVICE] BatchEndPoint``) up to
+  ``BatchSize`` payloads go in one request as ``{"notifications": [...]}``;
+  otherwise one request per payload, as before;
+* a failed delivery stays queued with an exponential retry delay, unless
+  the service rejected the payload itself (a 4xx answer other than 408 and
+  429): such payloads are moved to the ``failed`` table and logged. A
+  rejected batch is sent again one payload at a time, so one bad payload
+  does not hold back the others;
+* every payload gets an ``Idempotency-Key`` when it is queued, sent with
+  each delivery attempt, so the service can drop a payload it already
+  accepted. A batch carries its members' keys as ``idempotency_keys``
+  and a header key derived from them;
+* OutboxDrainer runs drain() on a background thread, woken by every put
+  and at least every ``DrainInterval`` seconds while anything is pending.
+
+Payloads survive QGIS restarts: whatever is left is sent by the next
+drainer, or by send_request.py.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+try:
+    from . import notifier as notifier_module
+except ImportError:  # Run from send_request.py as a script
+    import notifier as notifier_module
+
+OUTBOX_FILE = os.path.join(os.path.dirname(__file__), 'send_request_outbox.sqlite')
+
+# Longest wait between two attempts for one payload (seconds)
+MAX_RETRY_DELAY = 3600
+
+# Seconds claimed rows stay reserved for the drain that claimed them
+CLAIM_LEASE = 300
+
+_drainer = None
+_drainer_key = None
+_drainer_lock = threading.Lock()
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS outbox (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    payload TEXT NOT NULL,
+    created REAL NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt REAL NOT NULL DEFAULT 0,
+    last_error TEXT,
+    idempotency_key TEXT
+);
+CREATE TABLE IF NOT EXISTS failed (
+    id INTEGER PRIMARY KEY,
+    payload TEXT NOT NULL,
+    created REAL NOT NULL,
+    attempts INTEGER NOT NULL,
+    error TEXT,
+    idempotency_key TEXT,
+    failed_at REAL NOT NULL
+);
+"""
+
+
+class Outbox:
+    """Pending notification payloads in a SQLite file."""
+
+    def __init__(self, path=OUTBOX_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=FULL')
+        self.conn.executescript(SCHEMA)
+        columns = {row[1] for row in self.conn.execute('PRAGMA table_info(outbox)')}
+        if 'idempotency_key' not in columns:
+            # Outbox written by an older version
+            self.conn.execute('ALTER TABLE outbox ADD COLUMN idempotency_key TEXT')
+
+    def put(self, *payloads):
+        """Queue ``payloads`` (dicts) in one transaction."""
+        now = time.time()
+        with self._lock:
+            self.conn.execute('BEGIN IMMEDIATE')
+            try:
+                self.conn.executemany(
+                    'INSERT INTO outbox (payload, created, idempotency_key) VALUES (?, ?, ?)',
+                    [(json.dumps(payload), now, str(uuid.uuid4())) for payload in payloads])
+            except Exception:
+                self.conn.execute('ROLLBACK')
+                raise
+            self.conn.execute('COMMIT')
+
+    def claim(self, limit, lease=CLAIM_LEASE, now=None):
+        """Claim up to ``limit`` due ``(id, key, payload)``, oldest first.
+
+        The rows are not due again for ``lease`` seconds, unless delete()
+        or defer() is called for them first.
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            # IMMEDIATE takes the write lock before reading, so no other
+            # connection can claim the same rows in between
+            self.conn.execute('BEGIN IMMEDIATE')
+            try:
+                rows = self.conn.execute(
+                    'SELECT id, idempotency_key, payload FROM outbox WHERE next_attempt <= ? ORDER BY id LIMIT ?',
+                    (now, limit)).fetchall()
+                self.conn.executemany('UPDATE outbox SET next_attempt = ? WHERE id = ?',
+                                      [(now + lease, row[0]) for row in rows])
+            except Exception:
+                self.conn.execute('ROLLBACK')
+                raise
+            self.conn.execute('COMMIT')
+        # Rows queued before keys existed are keyed by their id
+        return [(row_id, key or f'outbox-{row_id}', json.loads(payload)) for row_id, key, payload in rows]
+
+    def delete(self, ids):
+        with self._lock:
+            self.conn.executemany('DELETE FROM outbox WHERE id = ?', [(row_id,) for row_id in ids])
+
+    def defer(self, ids, error, base_delay):
+        """Record a failed attempt; the next one waits ``base_delay * 2^attempts``."""
+        now = time.time()
+        with self._lock:
+            self.conn.executemany(
+                'UPDATE outbox SET attempts = attempts + 1, last_error = ?, '
+                'next_attempt = ? + min(?, ? * (1 << min(attempts, 20))) WHERE id = ?',
+                [(error, now, MAX_RETRY_DELAY, base_delay, row_id) for row_id in ids])
+
+    def fail(self, ids, error):
+        """Move rejected payloads to the ``failed`` table."""
+        now = time.time()
+        with self._lock:
+            self.conn.execute('BEGIN IMMEDIATE')
+            try:
+                self.conn.executemany(
+                    'INSERT OR REPLACE INTO failed (id, payload, created, attempts, error, idempotency_key, failed_at) '
+                    'SELECT id, payload, created, attempts + 1, ?, idempotency_key, ? FROM outbox WHERE id = ?',
+                    [(error, now, row_id) for row_id in ids])
+                self.conn.executemany('DELETE FROM outbox WHERE id = ?', [(row_id,) for row_id in ids])
+            except Exception:
+                self.conn.execute('ROLLBACK')
+                raise
+            self.conn.execute('COMMIT')
+
+    def failed_count(self):
+        with self._lock:
+            return self.conn.execute('SELECT count(*) FROM failed').fetchone()[0]
+
+    def count(self):
+        with self._lock:
+            return self.conn.execute('SELECT count(*) FROM outbox').fetchone()[0]
+
+    def next_due(self):
+        """Time the next pending payload is due, or None when empty."""
+        with self._lock:
+            return self.conn.execute('SELECT min(next_attempt) FROM outbox').fetchone()[0]
+
+    def close(self):
+        self.conn.close()
+
+
+def drain(outbox, notifier, batch_size=50, batch_end_point=None, retry_delay=30, lease=CLAIM_LEASE):
+    """Deliver due payloads until none are left or the service fails.
+
+    Only rows claimed by this drain are posted, deleted or deferred.
+    Returns ``(sent, error)``: the number of payloads delivered and the
+    transient error that stopped the drain, or None. Rejected payloads
+    are moved to the failed table and do not stop the drain.
+    """
+    sent = 0
+    while True:
+        rows = outbox.claim(batch_size if batch_end_point else 1, lease)
+        if not rows:
+            return sent, None
+        if batch_end_point:
+            keys = [key for _, key, _ in rows]
+            try:
+                notifier.post({'notifications': [payload for _, _, payload in rows], 'idempotency_keys': keys},
+                              batch_end_point, key=batch_key(keys))
+            except notifier_module.NotifyError as e:
+                if not e.permanent:
+                    outbox.defer([row_id for row_id, _, _ in rows], str(e), retry_delay)
+                    return sent, str(e)
+                notifier_module.get_logger().warning(
+                    'Batch of %d rejected, sending the payloads one by one: %s', len(rows), e)
+                delivered, error = _post_each(outbox, notifier, rows, retry_delay)
+                sent += delivered
+                if error:
+                    return sent, error
+                continue
+            outbox.delete([row_id for row_id, _, _ in rows])
+            sent += len(rows)
+        else:
+            delivered, error = _post_each(outbox, notifier, rows, retry_delay)
+            sent += delivered
+            if error:
+                return sent, error
+
+
+def _post_each(outbox, notifier, rows, retry_delay):
+    """Post claimed ``rows`` one at a time; returns ``(sent, transient error)``."""
+    sent = 0
+    for n, (row_id, key, payload) in enumerate(rows):
+        try:
+            notifier.post(payload, key=key)
+        except notifier_module.NotifyError as e:
+            if e.permanent:
+                notifier_module.get_logger().error('Payload %s rejected, moved to the failed table: %s', row_id, e)
+                outbox.fail([row_id], str(e))
+                continue
+            outbox.defer([row[0] for row in rows[n:]], str(e), retry_delay)
+            return sent, str(e)
+        outbox.delete([row_id])
+        sent += 1
+    return sent, None
+
+
+def batch_key(keys):
+    """Idempotency key of a batch: the same for the same member payloads."""
+    return str(uuid.uuid5(uuid.NAMESPACE_URL, 'outbox-batch:' + ','.join(keys)))
+
+
+class OutboxDrainer:
+    """Runs drain() on a daemon thread whenever payloads are queued."""
+
+    def __init__(self, outbox, notifier, batch_size=50, batch_end_point=None, interval=30):
+        self.outbox = outbox
+        self.notifier = notifier
+        self.batch_size = batch_size
+        self.batch_end_point = batch_end_point
+        self.interval = interval
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='outbox-drainer', daemon=True)
+        self._thread.start()
+
+    def put(self, *payloads):
+        """Queue ``payloads`` durably and wake the drainer."""
+        self.outbox.put(*payloads)
+        self._wake.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.clear()
+            try:
+                drain(self.outbox, self.notifier, self.batch_size, self.batch_end_point, self.interval)
+                next_due = self.outbox.next_due()
+                timeout = None if next_due is None else min(self.interval, max(0.0, next_due - time.time()))
+            except Exception:
+                # Keep the thread alive, the payloads are still in the outbox
+                notifier_module.get_logger().exception('Outbox drain failed')
+                timeout = self.interval
+            self._wake.wait(timeout)
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+        self._thread.join(timeout=5)
+        self.outbox.close()
+
+
+def from_config(config, notifier):
+    """OutboxDrainer for the ``[SERVICE]`` section of config.ini."""
+    service = config['SERVICE']
+    return OutboxDrainer(Outbox(), notifier,
+                         batch_size=service.getint('BatchSize', fallback=50),
+                         batch_end_point=service.get('BatchEndPoint', fallback='').strip() or None,
+                         interval=service.getfloat('DrainInterval', fallback=30))
+
+
+def get_drainer(config):
+    """Shared OutboxDrainer, restarted when the ``[SERVICE]`` settings change."""
+    global _drainer, _drainer_key
+    key = tuple(sorted(config['SERVICE'].items()))
+    with _drainer_lock:
+        if _drainer is None or _drainer_key != key:
+            if _drainer is not None:
+                _drainer.stop()
+            _drainer = from_config(config, notifier_module.get_notifier(config))
+            _drainer_key = key
+        return _drainer
+
+
+def shutdown():
+    """Stop the drainer thread; queued payloads stay in the outbox."""
+    global _drainer, _drainer_key
+    with _drainer_lock:
+        if _drainer is not None:
+            _drainer.stop()
+        _drainer = None
+        _drainer_key = None
@@ -0,0 +1,167 @@
+# -*- coding: utf-8 -*-
+"""
+Process-pool geometry building for large survey plans.
+
+Once the traverse engine has the beacon coordinates, parcels are
+independent of each other. build_geometries splits them into contiguous
+shards and builds them on a pool of worker processes. For each parcel a
+worker checks the ring, builds the polygon from the already transformed
+coordinates, computes area and centroid and builds the offset road lines.
+Results come back as plain tuples and WKB, in parcel order, and the
+calling thread only records them in its PlanStore.
+
+Worker processes run the Python interpreter shipped with QGIS (not the
+QGIS executable itself) with a headless QgsApplication, so they produce
+exactly the same geometries as the single threaded path. The pool is
+kept between runs because starting QGIS in every worker takes a while;
+shutdown() stops it.
+"""
+
+import multiprocessing
+import os
+import sys
+import threading
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+from . import ring_validator
+
+# Geometry of one parcel; ``issues`` lists ring_validator Issues (and the
+# rest is empty) when the polygon is invalid
+ParcelShape = namedtuple('ParcelShape', 'issues area centroid roads')
+
+# Shards per process, so a few slow shards do not leave processes idle
+SHARDS_PER_PROCESS = 4
+
+_pool = None
+_pool_size = 0
+_pool_lock = threading.Lock()
+
+# Per worker process
+_qgs_app = None
+
+
+def process_count(config):
+    """Processes configured by ``[PERFORMANCE] GeometryProcesses`` (0 = off)."""
+    value = config.get('PERFORMANCE', 'GeometryProcesses', fallback='0').strip().lower()
+    if value == 'auto':
+        return max(1, (os.cpu_count() or 1) - 1)
+    return max(0, int(value or 0))
+
+
+def _python_executable():
+    """Interpreter for the workers; inside QGIS sys.executable is qgis.exe."""
+    name = os.path.basename(sys.executable).lower()
+    if name.startswith('python'):
+        return sys.executable
+    for candidate in ('python.exe', 'python3.exe', os.path.join('bin', 'python3')):
+        path = os.path.join(sys.exec_prefix, candidate)
+        if os.path.exists(path):
+            return path
+    return sys.executable
+
+
+def _init_worker(prefix_path):
+    global _qgs_app
+    from qgis.core import QgsApplication
+    QgsApplication.setPrefixPath(prefix_path, True)
+    _qgs_app = QgsApplication([], False)
+    _qgs_app.initQgis()
+
+
+def get_pool(processes):
+    """Shared process pool with ``processes`` workers."""
+    global _pool, _pool_size
+    with _pool_lock:
+        if _pool is not None and _pool_size == processes:
+            return _pool
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+        from qgis.core import QgsApplication
+        context = multiprocessing.get_context('spawn')
+        context.set_executable(_python_executable())
+        _pool = ProcessPoolExecutor(max_workers=processes, mp_context=context,
+                                    initializer=_init_worker, initargs=(QgsApplication.prefixPath(),))
+        _pool_size = processes
+        return _pool
+
+
+def shutdown():
+    """Stop the worker processes, if any."""
+    global _pool, _pool_size
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+        _pool_size = 0
+
+
+def geos_messages(ring):
+    """Messages of the full QGIS validator for a ring of (x, y) tuples."""
+    from qgis.core import QgsGeometry, QgsPointXY
+    poly = QgsGeometry.fromPolygonXY([[QgsPointXY(x, y) for x, y in ring]])
+    return [error.what() for error in poly.validateGeometry()]
+
+
+def build_shard(parcels, vertex_threshold=ring_validator.VERTEX_THRESHOLD):
+    """Build ParcelShapes for ``parcels`` (runs in a worker process).
+
+    Each parcel is ``(ring, map_ring, map_roads)``: the ring as read (for
+    the validity check), the ring in the layer CRS and the road centre
+    lines in the layer CRS as ``(offset, points)``, all as (x, y) tuples.
+    Mirrors the single threaded code in GeomFromTextWorker.run.
+    """
+    from qgis.core import QgsGeometry, QgsPointXY
+    shapes = []
+    for ring, map_ring, map_roads in parcels:
+        issues = ring_validator.validate_ring(ring, geos_messages, vertex_threshold)
+        if issues:
+            shapes.append(ParcelShape(issues, None, None, []))
+            continue
+        poly = QgsGeometry.fromPolygonXY([[QgsPointXY(x, y) for x, y in map_ring]])
+        centroid = poly.centroid().asPoint()
+
+        road_wkbs = []
+        for offset, points in map_roads:
+            line_geom = QgsGeometry.fromPolylineXY([QgsPointXY(x, y) for x, y in points])
+            line_geom = line_geom.offsetCurve(offset, 8, QgsGeometry.JoinStyleMiter, 2)
+            road_wkbs.append((offset, bytes(line_geom.asWkb())))
+
+        shapes.append(ParcelShape(None, poly.area(), (centroid.x(), centroid.y()), road_wkbs))
+    return shapes
+
+
+def _parcel_payload(traverse, k, coords):
+    ring = traverse.ring(k)
+    if coords is None:
+        roads = [(traverse.road_offset[r], traverse.road(r)) for r in traverse.roads_for_parcel(k)]
+        return ring, ring, roads
+    roads = [(traverse.road_offset[r], coords.points(traverse.road_indices(r)))
+             for r in traverse.roads_for_parcel(k)]
+    return ring, coords.points(traverse.ring_range(k)), roads
+
+
+def build_geometries(traverse, processes, coords=None, progress=None,
+                     vertex_threshold=ring_validator.VERTEX_THRESHOLD):
+    """ParcelShape for every parcel of a TraverseResult, in parcel order.
+
+    ``coords`` is the batch_transform.TransformedCoords of the traverse, or
+    None when no transform is needed. ``progress`` is called with the
+    number of parcels done after each shard.
+    """
+    n = traverse.parcel_count
+    if not n:
+        return []
+    shard_size = max(1, -(-n // (processes * SHARDS_PER_PROCESS)))
+    pool = get_pool(processes)
+    futures = []
+    for start in range(0, n, shard_size):
+        payload = [_parcel_payload(traverse, k, coords) for k in range(start, min(start + shard_size, n))]
+        futures.append(pool.submit(build_shard, payload, vertex_threshold))
+
+    shapes = []
+    for future in futures:
+        shapes.extend(future.result())
+        if progress:
+            progress(len(shapes))
+    return shapes
@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+"""
+Parcel number allocation against land_registration___parcel_lookup.
+
+allocate_parcel_numbers reserves N parcel numbers for every block touched
+by a submission with a single ``INSERT ... ON CONFLICT ... DO UPDATE SET
+parcel_count = parcel_count + N RETURNING``. The row locks taken by the
+upsert make it safe when several operators submit plans for the same
+block at once, unlike the select/update through the layer edit buffer.
+
+lock_blocks additionally takes a transaction-level advisory lock per
+block, so a whole submission (counters, parcels, roads and beacons) for a
+block is serialized against other submitters until it commits or rolls
+back. Locks are taken in sorted order to avoid deadlocks.
+
+The upsert needs a unique constraint on the lookup table::
+
+    CREATE UNIQUE INDEX IF NOT EXISTS parcel_lookup_lga_block_uq
+        ON public.land_registration___parcel_lookup (lga_num, block_num);
+"""
+
+from collections import Counter
+
+try:
+    from psycopg2 import sql
+    from psycopg2.extras import execute_values
+except ImportError:
+    sql = execute_values = None
+
+LOOKUP_TABLE = ('public', 'land_registration___parcel_lookup')
+
+
+def count_by_block(block_keys):
+    """Number of parcels per (lga_num, block_num), in first-seen order.
+
+    ``block_keys`` holds the (lga_num, block_num) of every parcel, as from
+    PlanStore.block_keys. A NULL key would never conflict in the upsert
+    (and cannot be sorted with the others), so it raises ValueError.
+    """
+    counts = Counter(block_keys)
+    if any(lga_num is None or block_num is None for lga_num, block_num in counts):
+        raise ValueError('Parcel without LGA or block number, cannot allocate parcel numbers')
+    return counts
+
+
+def lock_blocks(conn, keys, table=LOOKUP_TABLE):
+    """Take ``pg_advisory_xact_lock`` for every (lga_num, block_num) in ``keys``.
+
+    Blocks until other transactions holding the same blocks finish. The
+    lock key is hashed from the table name and the block, so it does not
+    clash with advisory locks taken by other applications on the database.
+    """
+    namespace = '.'.join(table)
+    with conn.cursor() as cur:
+        for lga_num, block_num in sorted(set(keys)):
+            cur.execute('SELECT pg_advisory_xact_lock(hashtext(%s), hashtext(%s))',
+                        (namespace, f'{lga_num}:{block_num}'))
+
+
+def allocate_parcel_numbers(conn, counts, table=LOOKUP_TABLE):
+    """Reserve ``counts[(lga_num, block_num)]`` numbers per block.
+
+    Returns ``{(lga_num, block_num): first reserved number}``. Nothing is
+    committed, so the reservation is part of the caller's transaction.
+    """
+    if not counts:
+        return {}
+    query = sql.SQL(
+        'INSERT INTO {table} AS lkp (lga_num, block_num, parcel_count) VALUES %s '
+        'ON CONFLICT (lga_num, block_num) '
+        'DO UPDATE SET parcel_count = lkp.parcel_count + EXCLUDED.parcel_count '
+        'RETURNING lga_num, block_num, parcel_count'
+    ).format(table=sql.Identifier(*table))
+    # Sorted so concurrent submissions lock the same rows in the same order
+    values = sorted((lga_num, block_num, n) for (lga_num, block_num), n in counts.items())
+    with conn.cursor() as cur:
+        rows = execute_values(cur, query.as_string(conn), values, page_size=len(values), fetch=True)
+    return {(lga_num, block_num): parcel_count - counts[(lga_num, block_num)] + 1
+            for lga_num, block_num, parcel_count in rows}
+
+
+def assign_parcel_numbers(block_keys, first_numbers):
+    """Consecutive parcel numbers per block, in the order of ``block_keys``."""
+    next_numbers = dict(first_numbers)
+    parcel_nums = []
+    for key in block_keys:
+        parcel_nums.append(next_numbers[key])
+        next_numbers[key] += 1
+    return parcel_nums
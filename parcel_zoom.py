@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+"""
+Finding and zooming to parcels on the map.
+
+The review dialog and the post-commit zoom used to scan every layer of the
+project by name on each call, then send one ``"parcel_num" = n`` request
+per parcel to PostGIS. Here the project's parcels layer is found once and
+then fetched by id, and the ids come from a single request: either an
+``IN (...)`` filter on the parcel numbers or the fids returned by the
+insert, without geometry or attributes.
+"""
+
+from qgis.core import QgsFeatureRequest, QgsProject, QgsWkbTypes
+
+_parcels_layer_id = None
+
+
+def find_parcels_layer():
+    """The project's parcels polygon layer, or None.
+
+    Looked up by name once, then by layer id; a removed layer is looked up
+    again.
+    """
+    global _parcels_layer_id
+    project = QgsProject.instance()
+    if _parcels_layer_id:
+        layer = project.mapLayer(_parcels_layer_id)
+        if layer is not None:
+            return layer
+    polygons = [layer for layer in project.mapLayers().values()
+                if hasattr(layer, 'geometryType') and layer.geometryType() == QgsWkbTypes.PolygonGeometry]
+    layer = (next((layer for layer in polygons if layer.name() == 'parcels'), None) or
+             next((layer for layer in polygons if 'parcel' in layer.name().lower()), None))
+    _parcels_layer_id = layer.id() if layer is not None else None
+    return layer
+
+
+def _id_request():
+    request = QgsFeatureRequest()
+    request.setFlags(QgsFeatureRequest.NoGeometry)
+    request.setSubsetOfAttributes([])
+    return request
+
+
+def ids_for_parcel_nums(layer, parcel_nums):
+    """Feature ids of ``layer`` with any of ``parcel_nums``, in one request."""
+    parcel_nums = sorted({int(n) for n in parcel_nums if n is not None})
+    if not parcel_nums:
+        return []
+    request = _id_request()
+    request.setFilterExpression(f'"parcel_num" IN ({", ".join(str(n) for n in parcel_nums)})')
+    return [feat.id() for feat in layer.getFeatures(request)]
+
+
+def existing_ids(layer, fids):
+    """The ``fids`` that ``layer`` has, in one request."""
+    if not fids:
+        return []
+    request = _id_request()
+    request.setFilterFids(list(fids))
+    return [feat.id() for feat in layer.getFeatures(request)]
+
+
+def select_and_zoom(canvas, layer, ids):
+    """Select ``ids`` on ``layer`` and zoom the canvas to them."""
+    layer.selectByIds(ids)
+    canvas.zoomToFeatureIds(layer, ids)
@@ -0,0 +1,164 @@
+# -*- coding: utf-8 -*-
+"""
+Bulk PostGIS writer for parcels, beacons and roads.
+
+The postgres provider turns ``dataProvider().addFeatures`` into one INSERT
+per feature. PgBulkWriter instead streams the features with
+``COPY ... FROM STDIN`` (geometries as hex EWKB text) into a temporary
+table and moves them into the target table with a single
+``INSERT ... SELECT``. The new ids are taken from the key's sequence in
+the staging table beforehand, so they come back in feature order.
+
+Needs psycopg2 (shipped with QGIS on Windows); callers check HAS_PSYCOPG2
+and fall back to the provider when it is missing.
+"""
+
+import io
+import struct
+
+from qgis.core import QgsDataSourceUri
+from qgis.PyQt.QtCore import QDate, QDateTime, QVariant
+
+try:
+    import psycopg2
+    from psycopg2 import sql
+except ImportError:
+    psycopg2 = None
+
+HAS_PSYCOPG2 = psycopg2 is not None
+
+# EWKB flag marking that an SRID follows the geometry type
+EWKB_SRID_FLAG = 0x20000000
+
+
+def connect(config):
+    """Open a psycopg2 connection from the [PG] section of config.ini."""
+    if not HAS_PSYCOPG2:
+        raise RuntimeError('psycopg2 is not available')
+    return psycopg2.connect(
+        host=config['PG']['Host'].strip(),
+        port=config['PG']['Port'].strip(),
+        dbname=config['PG']['Database'].strip(),
+        user=config['PG']['UserName'].strip(),
+        password=config['PG']['Password'].strip(),
+        connect_timeout=3,
+        application_name='geom_from_text',
+    )
+
+
+def ewkb_hex(wkb, srid):
+    """Turn WKB bytes into hex EWKB carrying ``srid``."""
+    wkb = bytes(wkb)
+    fmt = '<I' if wkb[0] == 1 else '>I'
+    geom_type = struct.unpack(fmt, wkb[1:5])[0]
+    return (wkb[:1] + struct.pack(fmt, geom_type | EWKB_SRID_FLAG) +
+            struct.pack(fmt, srid) + wkb[5:]).hex()
+
+
+def copy_text(value):
+    """Format one attribute value for COPY text format."""
+    if value is None or (isinstance(value, QVariant) and value.isNull()):
+        return '\\N'
+    if isinstance(value, QDate):
+        return value.toString('yyyy-MM-dd') if value.isValid() else '\\N'
+    if isinstance(value, QDateTime):
+        return value.toString('yyyy-MM-ddTHH:mm:ss') if value.isValid() else '\\N'
+    text = str(value)
+    return (text.replace('\\', '\\\\').replace('\t', '\\t')
+            .replace('\n', '\\n').replace('\r', '\\r'))
+
+
+class PgBulkWriter:
+    """COPY-based writer sharing one psycopg2 connection.
+
+    Nothing is committed here: the caller owns the transaction, so several
+    tables can be loaded atomically and rolled back together.
+    """
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def copy_layer_features(self, layer, features):
+        """COPY ``features`` into the table behind postgres ``layer``.
+
+        Returns the new primary key values, in the order of ``features``.
+        """
+        if not features:
+            return []
+        uri = QgsDataSourceUri(layer.source())
+        fields = layer.dataProvider().fields()
+        pk_indexes = set(layer.dataProvider().pkAttributeIndexes())
+        pk = uri.keyColumn() or 'id'
+        attr_indexes = [i for i in range(fields.count())
+                        if i not in pk_indexes and fields.at(i).name() != pk]
+        columns = [fields.at(i).name() for i in attr_indexes]
+        geom_column = uri.geometryColumn()
+        srid = int(uri.srid()) if uri.srid() else layer.crs().postgisSrid()
+        if geom_column:
+            columns.append(geom_column)
+
+        buf = io.StringIO()
+        for ordinal, feat in enumerate(features):
+            attrs = feat.attributes()
+            values = [copy_text(attrs[i]) for i in attr_indexes]
+            if geom_column:
+                geom = feat.geometry()
+                values.append('\\N' if geom.isNull() else ewkb_hex(geom.asWkb(), srid))
+            values.append(str(ordinal))
+            buf.write('\t'.join(values))
+            buf.write('\n')
+        buf.seek(0)
+        return self.copy_rows(uri.schema() or 'public', uri.table(), columns, buf, pk)
+
+    def copy_rows(self, schema, table, columns, buf, pk='id'):
+        """COPY tab separated rows from ``buf`` into ``schema.table``.
+
+        Every row carries a trailing ordinal column. INSERT ... RETURNING
+        does not promise any row order, so the new ``pk`` values are drawn
+        from the key's sequence into the staging table first and read back
+        ordered by that ordinal. Without a sequence the rows are moved one
+        by one, in ordinal order.
+        """
+        target = sql.Identifier(schema, table)
+        staging = sql.Identifier('_bulk_' + table)
+        pk_column = sql.Identifier(pk)
+        column_list = sql.SQL(', ').join(sql.Identifier(c) for c in columns)
+        with self.conn.cursor() as cur:
+            cur.execute(sql.SQL(
+                'CREATE TEMP TABLE {staging} ON COMMIT DROP AS '
+                'SELECT {columns} FROM {target} WITH NO DATA'
+            ).format(staging=staging, columns=column_list, target=target))
+            cur.execute(sql.SQL('ALTER TABLE {staging} ADD COLUMN _ord integer').format(staging=staging))
+            cur.copy_expert(sql.SQL('COPY {staging} ({columns}, _ord) FROM STDIN').format(
+                staging=staging, columns=column_list).as_string(self.conn), buf)
+
+            cur.execute('SELECT pg_get_serial_sequence(%s, %s)', (target.as_string(self.conn), pk))
+            sequence = cur.fetchone()[0]
+            if sequence:
+                cur.execute(sql.SQL('ALTER TABLE {staging} ADD COLUMN _pk bigint').format(staging=staging))
+                cur.execute(sql.SQL('UPDATE {staging} SET _pk = nextval(%s)').format(staging=staging), (sequence,))
+                cur.execute(
+                    'SELECT is_identity FROM information_schema.columns '
+                    'WHERE table_schema = %s AND table_name = %s AND column_name = %s', (schema, table, pk))
+                row = cur.fetchone()
+                overriding = sql.SQL('OVERRIDING SYSTEM VALUE ' if row and row[0] == 'YES' else '')
+                cur.execute(sql.SQL(
+                    'INSERT INTO {target} ({columns}, {pk}) {overriding}'
+                    'SELECT {columns}, _pk FROM {staging}'
+                ).format(target=target, columns=column_list, pk=pk_column, overriding=overriding, staging=staging))
+                cur.execute(sql.SQL('SELECT _pk FROM {staging} ORDER BY _ord').format(staging=staging))
+                new_ids = [row[0] for row in cur.fetchall()]
+            else:
+                cur.execute(sql.SQL('SELECT _ord FROM {staging} ORDER BY _ord').format(staging=staging))
+                ordinals = [row[0] for row in cur.fetchall()]
+                insert = sql.SQL(
+                    'INSERT INTO {target} ({columns}) '
+                    'SELECT {columns} FROM {staging} WHERE _ord = %s '
+                    'RETURNING {pk}'
+                ).format(target=target, columns=column_list, staging=staging, pk=pk_column)
+                new_ids = []
+                for ordinal in ordinals:
+                    cur.execute(insert, (ordinal,))
+                    new_ids.append(cur.fetchone()[0])
+            cur.execute(sql.SQL('DROP TABLE {staging}').format(staging=staging))
+        return new_ids
@@ -0,0 +1,154 @@
+# -*- coding: utf-8 -*-
+"""
+Dry-run check of a survey plan CSV, without QGIS or PostGIS.
+
+The worker stops at the first bad row, so fixing a large plan used to take
+one full run per mistake. check_plan reads the whole file in one pass with
+the traverse engine in error collecting mode and reports every problem it
+finds:
+
+* rows the traverse cannot use (missing start XY, bad XY, bearing/distance
+  or road offset values);
+* parcels whose ring fails the quick checks of ring_validator;
+* parcels whose misclosure exceeds ``closure_tolerance``, when one is given.
+
+Each problem carries the CSV line, parcel id, beacon number, a short kind
+and the misclosure of its parcel: the distance between the parcel's
+computed last beacon and the ring start it should close on, or None for
+parcels that end on an XY beacon (see closure). Parcels that already have
+a bad row are not checked further, their coordinates are unknown (NaN).
+
+Run it directly for a report::
+
+    python plan_check.py survey_plan.csv --tolerance 0.05
+"""
+
+import math
+import sys
+import time
+from collections import namedtuple
+
+try:
+    from . import closure, ring_validator, traverse_engine
+except ImportError:  # Run as a script
+    import closure
+    import ring_validator
+    import traverse_engine
+
+Problem = namedtuple('Problem', 'line parcel_id beacon_num kind message misclosure')
+
+# Kinds that come from the rows themselves rather than the parcel geometry
+ROW_KINDS = ('no_start_xy', 'invalid_xy', 'invalid_bearing', 'invalid_offset')
+
+
+class PlanReport:
+    """Outcome of check_plan."""
+
+    def __init__(self, csv_path):
+        self.csv_path = csv_path
+        self.problems = []
+        self.misclosures = {}
+        self.parcel_count = 0
+        self.row_count = 0
+        self.seconds = 0.0
+
+    @property
+    def ok(self):
+        return not self.problems
+
+    def row_problems(self):
+        return [p for p in self.problems if p.kind in ROW_KINDS]
+
+    def summary(self, limit=20):
+        """Human readable list of the first ``limit`` problems."""
+        if self.ok:
+            return f'{self.parcel_count} parcels, {self.row_count} rows: no problems found'
+        lines = [f'{len(self.problems)} problem(s) in {self.parcel_count} parcels, {self.row_count} rows:']
+        for p in self.problems[:limit]:
+            where = f'line {p.line}, ' if p.line else ''
+            gap = ''
+            if p.kind != 'misclosure' and p.misclosure is not None and math.isfinite(p.misclosure):
+                gap = f' (misclosure {p.misclosure:.3f})'
+            lines.append(f'{where}Parcel {p.parcel_id}, Beacon {p.beacon_num}: {p.message}{gap}')
+        if len(self.problems) > limit:
+            lines.append(f'... and {len(self.problems) - limit} more')
+        return '\n'.join(lines)
+
+
+def check_plan(csv_path, closure_tolerance=None, geometry=True, use_mmap=False):
+    """Check a whole survey plan CSV and return a PlanReport.
+
+    ``geometry`` False skips the ring checks (only rows are checked).
+    Raises TraverseError only for an empty file.
+    """
+    started = time.perf_counter()
+    report = PlanReport(csv_path)
+    row_errors = []
+    stream = traverse_engine.CsvRowStream(csv_path, use_mmap)
+    traverse = traverse_engine.traverse_rows(stream, errors=row_errors)
+
+    report.parcel_count = traverse.parcel_count
+    report.row_count = traverse.beacon_count
+    closures = closure.compute_closures(traverse)
+    for k in range(traverse.parcel_count):
+        report.misclosures[traverse.parcel_ids[k]] = closures.misclosure[k]
+
+    broken = set()
+    for error in row_errors:
+        broken.add(error.parcel_id)
+        report.problems.append(Problem(error.line, error.parcel_id, error.beacon_num, error.kind,
+                                       error.message, report.misclosures.get(error.parcel_id)))
+
+    for k in range(traverse.parcel_count):
+        parcel_id = traverse.parcel_ids[k]
+        if parcel_id in broken:
+            continue
+        ring_beacons = traverse.ring_range(k)
+        misclosure = report.misclosures[parcel_id]
+        if not all(math.isfinite(traverse.xs[i]) for i in ring_beacons):
+            # Starts from the last beacon of a broken parcel
+            continue
+        if geometry:
+            for issue in ring_validator.quick_check(traverse.ring(k)):
+                beacon = ring_beacons[issue.vertex] if issue.vertex is not None else None
+                report.problems.append(Problem(
+                    _line_of(beacon), parcel_id,
+                    traverse.beacon_nums[beacon] if beacon is not None else None,
+                    issue.kind, issue.message, misclosure))
+        if closure_tolerance is not None and misclosure is not None and misclosure > closure_tolerance:
+            last = ring_beacons[-1]
+            report.problems.append(Problem(
+                _line_of(last), parcel_id, traverse.beacon_nums[last],
+                'misclosure', f'Misclosure {misclosure:.3f} exceeds {closure_tolerance} '
+                f'({closure.format_precision(closures.precision(k))})', misclosure))
+
+    report.problems.sort(key=lambda p: (p.line or 0))
+    report.seconds = time.perf_counter() - started
+    return report
+
+
+def _line_of(beacon):
+    # Every data row is one beacon, in file order after the header line
+    return beacon + 2 if beacon is not None else None
+
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(description='Check a survey plan CSV without touching the database.')
+    parser.add_argument('csv_path')
+    parser.add_argument('--tolerance', type=float, help='flag closed parcels whose misclosure exceeds this distance')
+    parser.add_argument('--limit', type=int, default=50, help='problems to print')
+    args = parser.parse_args(argv)
+
+    try:
+        report = check_plan(args.csv_path, args.tolerance)
+    except traverse_engine.TraverseError as e:
+        print(f'❌ {e}')
+        return 1
+    print(report.summary(args.limit))
+    print(f'Checked in {report.seconds * 1000:.1f} ms')
+    return 0 if report.ok else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
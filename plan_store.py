@@ -0,0 +1,238 @@
+# -*- coding: utf-8 -*-
+"""
+Compact columnar store of one processed survey plan.
+
+The worker used to hand the main thread a QgsFeature per parcel, road and
+beacon, plus a QgsPointXY per centroid, in dicts and lists keyed by parcel
+id. Each beacon feature costs several hundred bytes (feature, geometry,
+attribute vector, QDate) and all of them sat in memory while the operator
+looked at the review dialog.
+
+PlanStore keeps the plan in flat buffers instead:
+
+* beacons: the traverse's ``xs``/``ys`` (kept for the x/y attributes), the
+  coordinates in the layer CRS and the beacon numbers, about 40 bytes per
+  beacon; without a transform both pairs are the same arrays;
+* parcels: ids, ring and beacon ranges into those buffers, area, centroid
+  and the UPI columns (lga_num, block_num, parcel_num);
+* roads: owning parcel, offset and the offset line as WKB.
+
+The main thread materializes features only where a QGIS API needs them:
+parcel_features for the review layer and the writes, road_features and
+beacon_features (with the parcel's UPI already set) right before they are
+written. Features are filled from an attribute_template holding the
+per-layer constants (date, data source, status), with field indexes
+looked up once, and set with one setAttributes call each.
+"""
+
+from array import array
+from datetime import date
+
+# LGA and block given to parcels whose centroid falls outside every LGA or
+# block, so they still get a counter row and parcel numbers
+DEFAULT_BLOCK = 999
+
+
+class PlanStore:
+    """Parcels, roads and beacons of one processed plan, in parcel order."""
+
+    __slots__ = (
+        'data_source', 'status', 'created',
+        'parcel_ids', 'area', 'centroid_x', 'centroid_y',
+        'lga_num', 'block_num', 'parcel_num',
+        'ring_start', 'beacon_start', 'beacon_end',
+        'beacon_nums', 'xs', 'ys', 'map_xs', 'map_ys',
+        'road_parcel', 'road_offset', 'road_wkb',
+    )
+
+    def __init__(self, data_source=None, status=None, created=None):
+        self.data_source = data_source
+        self.status = status
+        self.created = created or date.today()
+        self.parcel_ids = []
+        self.area = array('d')
+        self.centroid_x = array('d')
+        self.centroid_y = array('d')
+        # Lists, not arrays: None until set_block is called for the parcel
+        self.lga_num = []
+        self.block_num = []
+        self.parcel_num = []
+        self.ring_start = array('l')
+        self.beacon_start = array('l')
+        self.beacon_end = array('l')
+        self.beacon_nums = []
+        self.xs = self.ys = self.map_xs = self.map_ys = array('d')
+        self.road_parcel = array('l')
+        self.road_offset = array('d')
+        self.road_wkb = []
+
+    def __len__(self):
+        return len(self.parcel_ids)
+
+    def add_parcel(self, area, centroid_x, centroid_y):
+        """Record the area and centroid of the next parcel."""
+        self.area.append(area)
+        self.centroid_x.append(centroid_x)
+        self.centroid_y.append(centroid_y)
+
+    def add_road(self, wkb):
+        """Record the offset line of the next road, as WKB bytes."""
+        self.road_wkb.append(bytes(wkb))
+
+    def set_traverse(self, traverse, coords=None):
+        """Take parcel ids, ranges and beacons from a finished TraverseResult.
+
+        ``coords`` is its batch_transform.TransformedCoords, or None when
+        the traverse is already in the layer CRS. The buffers are shared,
+        not copied.
+        """
+        n = traverse.parcel_count
+        self.parcel_ids = traverse.parcel_ids
+        self.beacon_start = traverse.parcel_beacon_start
+        self.beacon_end = traverse.parcel_beacon_end
+        self.ring_start = array('l', (traverse.ring_range(k).start for k in range(n)))
+        self.beacon_nums = traverse.beacon_nums
+        self.xs, self.ys = traverse.xs, traverse.ys
+        if coords is not None:
+            self.map_xs, self.map_ys = coords.xs, coords.ys
+        else:
+            self.map_xs, self.map_ys = traverse.xs, traverse.ys
+        self.road_parcel = traverse.road_parcel
+        self.road_offset = traverse.road_offset
+        self.lga_num = [None] * n
+        self.block_num = [None] * n
+        self.parcel_num = [None] * n
+
+    def set_block(self, k, lga_num, block_num):
+        """Set the LGA and block of parcel ``k`` from the spatial join.
+
+        A missing (None or NULL) value becomes DEFAULT_BLOCK. Returns True
+        when a default was used.
+        """
+        defaulted = False
+        if _missing(lga_num):
+            lga_num, defaulted = DEFAULT_BLOCK, True
+        if _missing(block_num):
+            block_num, defaulted = DEFAULT_BLOCK, True
+        self.lga_num[k] = lga_num
+        self.block_num[k] = block_num
+        return defaulted
+
+    def centroids(self):
+        """Parcel centroids as (x, y) tuples in the layer CRS."""
+        return list(zip(self.centroid_x, self.centroid_y))
+
+    def block_keys(self):
+        """(lga_num, block_num) of every parcel."""
+        return list(zip(self.lga_num, self.block_num))
+
+    def upi(self, k):
+        return self.lga_num[k], self.block_num[k], self.parcel_num[k]
+
+    def upi_dict(self):
+        """``{parcel_id: (lga_num, block_num, parcel_num)}``."""
+        return {pid: self.upi(k) for k, pid in enumerate(self.parcel_ids)}
+
+    def ring_points(self, k):
+        """QgsPointXY ring of parcel ``k`` in the layer CRS."""
+        from qgis.core import QgsPointXY
+        xs, ys = self.map_xs, self.map_ys
+        return [QgsPointXY(xs[i], ys[i]) for i in range(self.ring_start[k], self.beacon_end[k])]
+
+    def parcel_features(self, fields):
+        """A QgsFeature with ``fields`` for every parcel."""
+        from qgis.core import QgsFeature, QgsGeometry
+        from qgis.PyQt.QtCore import QDate
+        template = attribute_template(fields, data_source=self.data_source, status=self.status,
+                                      date_created=QDate(self.created))
+        area_idx = field_index(fields, 'area')
+        upi_idx = upi_indexes(fields)
+        feats = []
+        for k in range(len(self)):
+            attrs = template.copy()
+            attrs[area_idx] = self.area[k]
+            for idx, value in zip(upi_idx, self.upi(k)):
+                attrs[idx] = value
+            feat = QgsFeature(fields)
+            feat.setAttributes(attrs)
+            feat.setGeometry(QgsGeometry.fromPolygonXY([self.ring_points(k)]))
+            feats.append(feat)
+        return feats
+
+    def road_features(self, fields):
+        """A QgsFeature with ``fields`` for every road, carrying its parcel's UPI."""
+        from qgis.core import QgsFeature, QgsGeometry
+        template = attribute_template(fields)
+        offset_idx = field_index(fields, 'offset')
+        upi_idx = upi_indexes(fields)
+        feats = []
+        for r, wkb in enumerate(self.road_wkb):
+            attrs = template.copy()
+            attrs[offset_idx] = self.road_offset[r]
+            for idx, value in zip(upi_idx, self.upi(self.road_parcel[r])):
+                attrs[idx] = value
+            geom = QgsGeometry()
+            geom.fromWkb(wkb)
+            feat = QgsFeature(fields)
+            feat.setAttributes(attrs)
+            feat.setGeometry(geom)
+            feats.append(feat)
+        return feats
+
+    def beacon_features(self, fields):
+        """A QgsFeature with ``fields`` for every beacon, carrying its parcel's UPI."""
+        from qgis.core import QgsFeature, QgsGeometry, QgsPointXY
+        from qgis.PyQt.QtCore import QDate
+        template = attribute_template(fields, date_created=QDate(self.created))
+        num_idx = field_index(fields, 'beacon_num')
+        x_idx = field_index(fields, 'x')
+        y_idx = field_index(fields, 'y')
+        upi_idx = upi_indexes(fields)
+        beacon_nums, xs, ys, map_xs, map_ys = self.beacon_nums, self.xs, self.ys, self.map_xs, self.map_ys
+        feats = []
+        for k in range(len(self)):
+            # One template per parcel: only the beacon's own values change below
+            parcel_template = template.copy()
+            for idx, value in zip(upi_idx, self.upi(k)):
+                parcel_template[idx] = value
+            for i in range(self.beacon_start[k], self.beacon_end[k]):
+                attrs = parcel_template.copy()
+                attrs[num_idx] = beacon_nums[i]
+                attrs[x_idx] = xs[i]
+                attrs[y_idx] = ys[i]
+                feat = QgsFeature(fields)
+                feat.setAttributes(attrs)
+                feat.setGeometry(QgsGeometry.fromPointXY(QgsPointXY(map_xs[i], map_ys[i])))
+                feats.append(feat)
+        return feats
+
+
+def field_index(fields, name):
+    """Index of field ``name``; KeyError when the layer does not have it."""
+    idx = fields.indexFromName(name)
+    if idx == -1:
+        raise KeyError(f'Field {name} not found')
+    return idx
+
+
+def upi_indexes(fields):
+    return [field_index(fields, name) for name in ('lga_num', 'block_num', 'parcel_num')]
+
+
+def attribute_template(fields, **constants):
+    """Attribute list for ``fields``: NULL everywhere but the ``constants``.
+
+    Features copy it and fill in their own values, so field lookups and
+    constant values like the creation QDate are done once per layer.
+    """
+    attrs = [None] * fields.count()
+    for name, value in constants.items():
+        idx = fields.indexFromName(name)
+        if idx != -1:
+            attrs[idx] = value
+    return attrs
+
+
+def _missing(value):
+    # None from the indexed and server joins, a NULL QVariant from processing
+    return value is None or (hasattr(value, 'isNull') and value.isNull())
@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+"""
+Tiered validity check for parcel rings.
+
+``QgsGeometry.validateGeometry`` runs the full validator for every parcel,
+although almost all survey parcels are small simple polygons. validate_ring
+runs cheap checks first, in plain Python:
+
+* enough distinct vertices (closing the ring when it is not closed);
+* no duplicate consecutive vertices;
+* finite coordinates and a non-degenerate bounding box;
+* non-zero signed area;
+* no self-intersections, found with a sweep over the segments sorted by x
+  so only segments with overlapping x ranges are compared.
+
+Only rings that fail a cheap check, or have more than ``vertex_threshold``
+vertices, go to the expensive ``geos_check`` callback. Its verdict is final,
+so a parcel is never rejected on the cheap checks alone. Nothing in here
+imports qgis.
+"""
+
+import heapq
+import math
+from collections import namedtuple
+
+# Above this many vertices the full validator runs even for clean rings
+VERTEX_THRESHOLD = 64
+
+# ``vertex`` is the index of the offending vertex in the ring, or None
+Issue = namedtuple('Issue', 'kind message vertex')
+
+
+def signed_area(ring):
+    """Shoelace area of an unclosed ring; positive when counter-clockwise."""
+    n = len(ring)
+    total = 0.0
+    for i in range(n):
+        x1, y1 = ring[i]
+        x2, y2 = ring[(i + 1) % n]
+        total += x1 * y2 - x2 * y1
+    return total / 2
+
+
+def _orient(a, b, c):
+    value = (b[0] - a[0]) * (c[1] - a[1]) - (b[1] - a[1]) * (c[0] - a[0])
+    return (value > 0) - (value < 0)
+
+
+def _dot(o, a, b):
+    return (a[0] - o[0]) * (b[0] - o[0]) + (a[1] - o[1]) * (b[1] - o[1])
+
+
+def _on_segment(a, b, p):
+    return min(a[0], b[0]) <= p[0] <= max(a[0], b[0]) and min(a[1], b[1]) <= p[1] <= max(a[1], b[1])
+
+
+def _segments_intersect(a, b, c, d):
+    """True if segments ab and cd share at least one point."""
+    o1, o2 = _orient(a, b, c), _orient(a, b, d)
+    o3, o4 = _orient(c, d, a), _orient(c, d, b)
+    if o1 != o2 and o3 != o4:
+        return True
+    return ((o1 == 0 and _on_segment(a, b, c)) or (o2 == 0 and _on_segment(a, b, d)) or
+            (o3 == 0 and _on_segment(c, d, a)) or (o4 == 0 and _on_segment(c, d, b)))
+
+
+def find_self_intersection(ring):
+    """Indices ``(i, j)`` of two intersecting segments of the ring, or None.
+
+    Segment ``i`` runs from vertex ``i`` to vertex ``i + 1`` (wrapping).
+    Neighbouring segments may share their common vertex but must not fold
+    back onto each other.
+    """
+    n = len(ring)
+    segments = []
+    for i in range(n):
+        a, b = ring[i], ring[(i + 1) % n]
+        segments.append((min(a[0], b[0]), max(a[0], b[0]), i))
+    segments.sort()
+
+    active = []  # heap of (max_x, index)
+    for min_x, max_x, i in segments:
+        while active and active[0][0] < min_x:
+            heapq.heappop(active)
+        a, b = ring[i], ring[(i + 1) % n]
+        for _, j in active:
+            c, d = ring[j], ring[(j + 1) % n]
+            if max(a[1], b[1]) < min(c[1], d[1]) or max(c[1], d[1]) < min(a[1], b[1]):
+                continue
+            if (j + 1) % n == i or (i + 1) % n == j:
+                # Neighbours share one vertex; only folding back onto each other is an error
+                shared, p, q = (a, b, c) if (j + 1) % n == i else (b, a, d)
+                if _orient(shared, p, q) == 0 and _dot(shared, p, q) > 0:
+                    return (min(i, j), max(i, j))
+            elif _segments_intersect(a, b, c, d):
+                return (min(i, j), max(i, j))
+        heapq.heappush(active, (max_x, i))
+    return None
+
+
+def quick_check(ring):
+    """Cheap checks on a ring of (x, y) tuples; returns a list of Issues."""
+    ring = list(ring)
+    if len(ring) > 1 and ring[0] == ring[-1]:
+        ring.pop()
+    if len(ring) < 3:
+        return [Issue('too_few_vertices', f'Ring has {len(ring)} distinct vertices, at least 3 are needed', None)]
+
+    for i, (x, y) in enumerate(ring):
+        if not (math.isfinite(x) and math.isfinite(y)):
+            return [Issue('bad_coordinate', f'Vertex {i} has a non-finite coordinate', i)]
+
+    issues = []
+    for i in range(len(ring)):
+        if ring[i] == ring[(i + 1) % len(ring)]:
+            issues.append(Issue('duplicate_vertex', f'Vertex {(i + 1) % len(ring)} repeats vertex {i}', (i + 1) % len(ring)))
+    if issues:
+        return issues
+
+    xs = [x for x, _ in ring]
+    ys = [y for _, y in ring]
+    if max(xs) == min(xs) or max(ys) == min(ys):
+        return [Issue('degenerate_extent', 'Ring has a zero width or height bounding box', None)]
+    if signed_area(ring) == 0:
+        return [Issue('zero_area', 'Ring encloses no area', None)]
+
+    crossing = find_self_intersection(ring)
+    if crossing:
+        i, j = crossing
+        return [Issue('self_intersection', f'Segments {i} and {j} intersect', j)]
+    return []
+
+
+def validate_ring(ring, geos_check=None, vertex_threshold=VERTEX_THRESHOLD):
+    """Issues of ``ring``, an empty list when it is valid.
+
+    ``geos_check(ring)`` returns the full validator's error messages; it is
+    only called when a cheap check fails or the ring has more than
+    ``vertex_threshold`` vertices. Without it the cheap issues are final.
+    """
+    issues = quick_check(ring)
+    if not issues and len(ring) <= vertex_threshold:
+        return []
+    if geos_check is None:
+        return issues
+    messages = geos_check(ring)
+    if not messages:
+        return []
+    return issues or [Issue('invalid', message, None) for message in messages]
@@ -1,29 +1,17 @@
 import sys
-import requests
 import configparser
 import os
 import logging
-from logging.handlers import RotatingFileHandler
+
+from notifier import from_config, get_logger
+from outbox import Outbox, drain
 
 # -------------------------------------------------------------------------------------------------------
 # --- Logging Configuration ---
 
-# Log file path
-log_file = os.path.join(os.path.dirname(__file__), 'send_request.log')
-
-# Configure root logger (everything at INFO level)
-logging.basicConfig(
-    level=logging.INFO,  # Log only INFO and above
-    format="%(asctime)s - %(levelname)s - %(message)s",
-    datefmt="%d-%m-%Y %H:%M:%S",
-    handlers=[
-        RotatingFileHandler(log_file, maxBytes=5*1024*1024, backupCount=3),
-        logging.StreamHandler(sys.stdout)  # Logs to console
-    ]
-)
-
-# Get logger instance
-logger = logging.getLogger(__name__)
+# Requests are logged to send_request.log by the notifier; also echo them to the console
+logger = get_logger()
+logger.addHandler(logging.StreamHandler(sys.stdout))
 
 # -------------------------------------------------------------------------------------------------------
 # --- End Point Settings ---
@@ -33,30 +21,40 @@ ini_path = os.path.join(os.path.dirname(__file__), 'config.ini')
 # Read INI file
 config = configparser.ConfigParser()
 config.read(ini_path)
-# Get service URL
-end_point = config['SERVICE']['EndPoint']
 
 # -------------------------------------------------------------------------------------------------------
 # --- Functions ---
 
-def send_data(data_dict):
+def send_data(data_dict=None):
     """
-    Sends the given data dictionary as a JSON payload to the server endpoint.
+    Queues the given data dictionary in the outbox and delivers everything pending.
+    Payloads the service does not accept stay in the outbox for the next attempt.
+    Returns True when nothing is left to send.
     """
+    outbox = Outbox()
     try:
-        response = requests.post(end_point, json=data_dict)
-        response.raise_for_status()  # Raise an error for bad responses
-        logger.info("Request successful: %s", response.json())  # Log response content
-    except requests.exceptions.RequestException as e:
-        logger.error("Error sending request: %s", e, exc_info=True)  # Log full traceback
-        sys.exit(1)
+        if data_dict is not None:
+            outbox.put(data_dict)
+        service = config['SERVICE']
+        sent, error = drain(outbox, from_config(config),
+                            batch_size=service.getint('BatchSize', fallback=50),
+                            batch_end_point=service.get('BatchEndPoint', fallback='').strip() or None,
+                            retry_delay=service.getfloat('DrainInterval', fallback=30))
+        if error:
+            logger.warning("%d notification(s) sent, %d left in the outbox: %s", sent, outbox.count(), error)
+        return error is None
+    finally:
+        outbox.close()
 
 
 if __name__ == "__main__":
-    plugin_data = {
-        'application_number': sys.argv[1],
-        'lga_name': sys.argv[2],
-        'block_number': sys.argv[3],
-        'parcel_number': sys.argv[4]
-    }
+    # Without arguments only the pending notifications are sent
+    plugin_data = None
+    if len(sys.argv) > 1:
+        plugin_data = {
+            'application_number': sys.argv[1],
+            'lga_name': sys.argv[2],
+            'block_number': sys.argv[3],
+            'parcel_number': sys.argv[4]
+        }
     send_data(plugin_data)
@@ -0,0 +1,167 @@
+# -*- coding: utf-8 -*-
+"""
+LGA and block assignment for parcel centroids.
+
+server_side_join sends only the centroids to PostGIS (as a VALUES list)
+and gets ``lga_num``/``block_num`` back from one ``ST_Intersects`` query
+that uses the GiST indexes of the boundary tables, instead of downloading
+the whole LGA and block tables into QGIS.
+
+When the join has to run in QGIS instead, bbox_subset restricts the LGA
+and block layers to the envelope of the centroids with an ``&&`` filter,
+so only the few polygons around the survey plan are fetched, and
+indexed_join resolves both attributes in a single pass over the centroids
+with a QgsSpatialIndex and prepared geometries rather than going through
+``processing.run``.
+
+Results have the same shape as the ``join_results`` dict built by the
+worker: ``{parcel_id: {'lga_num': ..., 'block_num': ...}}``, with None
+where a centroid falls outside every polygon.
+"""
+
+from qgis.core import (QgsCoordinateTransform, QgsFeatureRequest, QgsGeometry,
+                       QgsProject, QgsRectangle, QgsSpatialIndex)
+
+try:
+    from psycopg2 import sql
+    from psycopg2.extras import execute_values
+except ImportError:
+    sql = execute_values = None
+
+
+def envelope(points, margin=1.0):
+    """(xmin, ymin, xmax, ymax) of (x, y) ``points``, grown by ``margin``."""
+    xs = [x for x, _ in points]
+    ys = [y for _, y in points]
+    return (min(xs) - margin, min(ys) - margin, max(xs) + margin, max(ys) + margin)
+
+
+def bbox_subset(geom_column, bbox, srid):
+    """Subset string keeping the rows whose geometry overlaps ``bbox``."""
+    xmin, ymin, xmax, ymax = bbox
+    return (f'"{geom_column}" && ST_MakeEnvelope('
+            f'{xmin!r}, {ymin!r}, {xmax!r}, {ymax!r}, {int(srid)})')
+
+
+class PolygonIndex:
+    """Point-in-polygon lookup of one attribute of a set of polygons.
+
+    Polygons are kept in ``crs`` in a QgsSpatialIndex; a geometry engine is
+    prepared for a polygon the first time a point falls inside its
+    bounding box.
+    """
+
+    def __init__(self, crs):
+        self.crs = crs
+        self.index = QgsSpatialIndex()
+        self.geometries = {}
+        self.values = {}
+        self.engines = {}
+
+    @classmethod
+    def from_features(cls, features, attribute, source_crs, crs):
+        """Index ``attribute`` of QgsFeatures given in ``source_crs``."""
+        polygon_index = cls(crs)
+        tr = None
+        if source_crs != crs:
+            tr = QgsCoordinateTransform(source_crs, crs, QgsProject.instance())
+        for feat in features:
+            geom = feat.geometry()
+            if geom.isNull():
+                continue
+            if tr:
+                geom.transform(tr)
+            polygon_index.add(feat.id(), feat[attribute], geom)
+        return polygon_index
+
+    @classmethod
+    def from_layer(cls, layer, attribute, crs):
+        """Read every polygon of ``layer`` (respecting its subset string)."""
+        request = QgsFeatureRequest().setSubsetOfAttributes([attribute], layer.fields())
+        return cls.from_features(layer.getFeatures(request), attribute, layer.crs(), crs)
+
+    def add(self, fid, value, geom):
+        self.index.addFeature(fid, geom.boundingBox())
+        self.geometries[fid] = geom
+        self.values[fid] = value
+
+    def __len__(self):
+        return len(self.values)
+
+    def _engine(self, fid):
+        engine = self.engines.get(fid)
+        if engine is None:
+            engine = QgsGeometry.createGeometryEngine(self.geometries[fid].constGet())
+            engine.prepareGeometry()
+            self.engines[fid] = engine
+        return engine
+
+    def lookup(self, point):
+        """Attribute value of the first polygon containing QgsPointXY ``point``, or None."""
+        candidates = self.index.intersects(QgsRectangle(point.x(), point.y(), point.x(), point.y()))
+        if not candidates:
+            return None
+        point_geom = QgsGeometry.fromPointXY(point)
+        for fid in sorted(candidates):
+            if self._engine(fid).intersects(point_geom.constGet()):
+                return self.values[fid]
+        return None
+
+
+def indexed_join(lga_layer, blocks_layer, parcel_ids, centroids, crs):
+    """Resolve lga_num and block_num for QgsPointXY ``centroids`` in ``crs``."""
+    return lookup_join(PolygonIndex.from_layer(lga_layer, 'lga_num', crs),
+                       PolygonIndex.from_layer(blocks_layer, 'block_num', crs),
+                       parcel_ids, centroids)
+
+
+def lookup_join(lga_index, blocks_index, parcel_ids, centroids):
+    """Resolve lga_num and block_num from two ready PolygonIndex objects."""
+    return {
+        pid: {'lga_num': lga_index.lookup(pt), 'block_num': blocks_index.lookup(pt)}
+        for pid, pt in zip(parcel_ids, centroids)
+    }
+
+
+def _find_srid(cur, table):
+    schema, name, geom_column = table
+    cur.execute('SELECT Find_SRID(%s, %s, %s)', (schema, name, geom_column))
+    return cur.fetchone()[0]
+
+
+def server_side_join(conn, parcel_ids, centroids, lga_table, blocks_table, srid=26331):
+    """Resolve lga_num and block_num for every centroid in one query.
+
+    ``centroids`` are (x, y) tuples in ``srid``; ``lga_table`` and
+    ``blocks_table`` are (schema, table, geometry column) tuples.
+    """
+    if not parcel_ids:
+        return {}
+    with conn.cursor() as cur:
+        lga_srid = _find_srid(cur, lga_table)
+        blocks_srid = _find_srid(cur, blocks_table)
+        query = sql.SQL(
+            'SELECT c.parcel_id, l.lga_num, b.block_num '
+            'FROM (VALUES %s) AS c(parcel_id, x, y) '
+            'CROSS JOIN LATERAL (SELECT ST_SetSRID(ST_MakePoint(c.x, c.y), {srid}) AS geom) AS pt '
+            'LEFT JOIN LATERAL (SELECT lga_num FROM {lga} '
+            '    WHERE ST_Intersects({lga_geom}, ST_Transform(pt.geom, {lga_srid})) LIMIT 1) AS l ON true '
+            'LEFT JOIN LATERAL (SELECT block_num FROM {blocks} '
+            '    WHERE ST_Intersects({blocks_geom}, ST_Transform(pt.geom, {blocks_srid})) LIMIT 1) AS b ON true'
+        ).format(
+            srid=sql.Literal(srid),
+            lga=sql.Identifier(lga_table[0], lga_table[1]),
+            lga_geom=sql.Identifier(lga_table[2]),
+            lga_srid=sql.Literal(lga_srid),
+            blocks=sql.Identifier(blocks_table[0], blocks_table[1]),
+            blocks_geom=sql.Identifier(blocks_table[2]),
+            blocks_srid=sql.Literal(blocks_srid),
+        )
+        rows = execute_values(
+            cur, query.as_string(conn),
+            [(pid, x, y) for pid, (x, y) in zip(parcel_ids, centroids)],
+            template='(%s::text, %s::float8, %s::float8)',
+            page_size=max(len(parcel_ids), 1),
+            fetch=True,
+        )
+    return {pid: {'lga_num': lga_num, 'block_num': block_num} for pid, lga_num, block_num in rows}
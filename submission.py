@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+"""
+Transactional write of one processed survey plan.
+
+commit_result takes the result dict emitted by GeomFromTextWorker and writes
+it on one psycopg2 connection, in one transaction:
+
+1. advisory locks on the touched blocks (parcel_counter.lock_blocks);
+2. parcel numbers reserved with one upsert on the lookup table;
+3. parcels, then roads and beacons carrying the parcels' UPI, with COPY;
+4. a single commit, or a rollback leaving nothing behind.
+
+No dialogs or message bar here, so the same path serves the plugin and the
+headless batch runner.
+"""
+
+from . import parcel_counter
+from .pg_bulk import PgBulkWriter
+
+
+def commit_result(conn, result):
+    """Write a successful worker ``result`` in one transaction on ``conn``.
+
+    The features are built from the result's PlanStore only here, with the
+    reserved parcel numbers already in place. Returns ``(new_parcel_ids,
+    upi_dict)``. On any error the transaction is rolled back and the
+    exception re-raised.
+    """
+    plan = result['plan']
+    writer = PgBulkWriter(conn)
+    try:
+        block_keys = plan.block_keys()
+        counts = parcel_counter.count_by_block(block_keys)
+        parcel_counter.lock_blocks(conn, counts)
+        first_numbers = parcel_counter.allocate_parcel_numbers(conn, counts)
+        plan.parcel_num = parcel_counter.assign_parcel_numbers(block_keys, first_numbers)
+
+        parcels, roads, beacons = result['parcels'], result['roads'], result['beacons']
+        new_ids = writer.copy_layer_features(parcels, plan.parcel_features(parcels.fields()))
+        writer.copy_layer_features(roads, plan.road_features(roads.fields()))
+        writer.copy_layer_features(beacons, plan.beacon_features(beacons.fields()))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return new_ids, plan.upi_dict()
@@ -0,0 +1,417 @@
+# -*- coding: utf-8 -*-
+"""
+Traverse engine for survey plan CSV files.
+
+Turns the CSV rows (parcel_id, beacon_num, x, y, deg, min, dist, offset)
+into compact coordinate arrays plus per-parcel and per-road index ranges.
+Nothing in here imports qgis, so whole survey files can be parsed and
+checked headlessly (see dev_runner.py) before any QgsFeature is created.
+
+Bearing/distance rows are traversed in one batch: when NumPy is available
+(it ships with QGIS) all beacon coordinates of the file are computed as a
+cumulative sum of ``dist*sin(bearing)`` / ``dist*cos(bearing)`` from the
+last XY row, otherwise a plain Python loop does the same thing.
+
+Files are read in a single streaming pass (optionally memory-mapped):
+progress is reported from the byte offset reached in the file and parcels
+are yielded as soon as their coordinates are known, so nothing has to
+count the rows up front.
+"""
+
+import csv
+import math
+import mmap
+import os
+from array import array
+from collections import namedtuple
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - QGIS always ships NumPy
+    np = None
+
+HAS_NUMPY = np is not None
+
+# CSV column positions
+COL_PARCEL_ID = 0
+COL_BEACON_NUM = 1
+COL_X = 2
+COL_Y = 3
+COL_DEG = 4
+COL_MIN = 5
+COL_DIST = 6
+COL_OFFSET = 7
+N_COLUMNS = 8
+
+
+class TraverseError(Exception):
+    """Raised when the CSV cannot be turned into parcels."""
+
+
+# One bad row found when collecting errors; ``line`` is the 1-based line in
+# the file (the header is line 1)
+RowError = namedtuple('RowError', 'line parcel_id beacon_num kind message')
+
+
+class TraverseResult:
+    """Parcels, beacons and road offsets of one survey plan.
+
+    Beacons are stored once, in CSV order, in the ``xs``/``ys`` buffers;
+    ``anchors`` marks the beacons given as XY rather than bearing/distance.
+    Parcels and roads only hold index ranges into those buffers:
+
+    * parcel ``k`` owns beacons ``parcel_beacon_start[k]:parcel_beacon_end[k]``
+      and its ring starts one beacon earlier for every parcel but the first
+      (the previous parcel's last point is the next parcel's starting point);
+    * road ``r`` belongs to parcel ``road_parcel[r]``, is offset by
+      ``road_offset[r]`` and its vertices are the beacon indices
+      ``road_vertices[road_vertex_start[r]:road_vertex_end[r]]``; the roads
+      of parcel ``k`` are ``parcel_road_start[k]:parcel_road_end[k]``.
+    """
+
+    __slots__ = (
+        'xs', 'ys', 'anchors', 'beacon_nums',
+        'parcel_ids', 'parcel_beacon_start', 'parcel_beacon_end',
+        'parcel_road_start', 'parcel_road_end',
+        'road_parcel', 'road_offset', 'road_vertices',
+        'road_vertex_start', 'road_vertex_end',
+    )
+
+    def __init__(self):
+        self.xs = array('d')
+        self.ys = array('d')
+        self.anchors = array('b')
+        self.beacon_nums = []
+        self.parcel_ids = []
+        self.parcel_beacon_start = array('l')
+        self.parcel_beacon_end = array('l')
+        self.parcel_road_start = array('l')
+        self.parcel_road_end = array('l')
+        self.road_parcel = array('l')
+        self.road_offset = array('d')
+        self.road_vertices = array('l')
+        self.road_vertex_start = array('l')
+        self.road_vertex_end = array('l')
+
+    @property
+    def beacon_count(self):
+        return len(self.beacon_nums)
+
+    @property
+    def parcel_count(self):
+        return len(self.parcel_ids)
+
+    @property
+    def road_count(self):
+        return len(self.road_parcel)
+
+    def ring_range(self, k):
+        """Beacon index range of the (unclosed) ring of parcel ``k``."""
+        start = self.parcel_beacon_start[k]
+        return range(start - 1 if k else start, self.parcel_beacon_end[k])
+
+    def ring(self, k):
+        """List of (x, y) tuples making up the ring of parcel ``k``."""
+        xs, ys = self.xs, self.ys
+        return [(xs[i], ys[i]) for i in self.ring_range(k)]
+
+    def beacon_range(self, k):
+        """Beacon index range owned by parcel ``k``."""
+        return range(self.parcel_beacon_start[k], self.parcel_beacon_end[k])
+
+    def road_indices(self, r):
+        """Beacon indices of the centre line vertices of road ``r``."""
+        return self.road_vertices[self.road_vertex_start[r]:self.road_vertex_end[r]]
+
+    def road(self, r):
+        """List of (x, y) tuples making up the centre line of road ``r``."""
+        xs, ys = self.xs, self.ys
+        return [(xs[i], ys[i]) for i in self.road_indices(r)]
+
+    def roads_for_parcel(self, k):
+        """Indices of the roads belonging to parcel ``k``."""
+        return range(self.parcel_road_start[k], self.parcel_road_end[k])
+
+
+def project(x, y, dist, bearing):
+    """Same as QgsPointXY.project: bearing in degrees clockwise from north."""
+    rads = math.radians(bearing)
+    return x + dist * math.sin(rads), y + dist * math.cos(rads)
+
+
+def _traverse_python(start, is_anchor, anchor_x, anchor_y, deg, minutes, dist):
+    """Walk a chunk of the traverse one beacon at a time from ``start``."""
+    xs = array('d')
+    ys = array('d')
+    x, y = start
+    for i in range(len(is_anchor)):
+        if is_anchor[i]:
+            x = anchor_x[i]
+            y = anchor_y[i]
+        elif dist[i]:
+            x, y = project(x, y, dist[i], deg[i] + minutes[i] / 60)
+        xs.append(x)
+        ys.append(y)
+    return xs, ys
+
+
+def _traverse_numpy(start, is_anchor, anchor_x, anchor_y, deg, minutes, dist):
+    """Compute a whole chunk of the traverse at once.
+
+    Each beacon is the last XY row (its anchor) plus the cumulative sum of
+    the bearing/distance legs since that anchor. Rows before the first
+    anchor of the chunk continue from ``start``.
+    """
+    is_anchor = np.frombuffer(is_anchor, dtype=np.int8).astype(bool)
+    dist = np.frombuffer(dist, dtype=np.float64)
+    rads = np.radians(np.frombuffer(deg, dtype=np.float64) + np.frombuffer(minutes, dtype=np.float64) / 60)
+    dx = np.where(is_anchor, 0.0, dist * np.sin(rads))
+    dy = np.where(is_anchor, 0.0, dist * np.cos(rads))
+    cx = np.cumsum(dx)
+    cy = np.cumsum(dy)
+
+    anchors = np.flatnonzero(is_anchor)
+    group = np.cumsum(is_anchor)
+    start_x = np.concatenate(([start[0]], np.frombuffer(anchor_x, dtype=np.float64)[anchors] - cx[anchors]))
+    start_y = np.concatenate(([start[1]], np.frombuffer(anchor_y, dtype=np.float64)[anchors] - cy[anchors]))
+    xs = start_x[group] + cx
+    ys = start_y[group] + cy
+    return array('d', xs.tobytes()), array('d', ys.tobytes())
+
+
+def iter_traverse(rows, progress=None, progress_every=25, vectorized=None, chunk_rows=4096, errors=None):
+    """Traverse CSV data rows (header already skipped) as a stream.
+
+    Yields ``(result, k)`` for every parcel ``k`` as soon as its beacon
+    coordinates are known; ``result`` is the TraverseResult being filled,
+    complete up to parcel ``k``. Coordinates are computed in chunks of at
+    least ``chunk_rows`` rows.
+
+    ``progress`` is called with the number of processed rows every
+    ``progress_every`` rows. Raises TraverseError on the first bad row,
+    with the same messages the worker has always shown to the user.
+
+    ``vectorized`` selects the NumPy traversal; by default it is used
+    whenever NumPy can be imported.
+
+    When ``errors`` is a list, bad rows are appended to it as RowErrors
+    instead of raising and the traverse goes on: a row whose position
+    cannot be computed becomes a NaN anchor, so every beacon depending on
+    it is NaN until the next XY row. Only an empty file still raises.
+    """
+    if vectorized is None:
+        vectorized = HAS_NUMPY
+    elif vectorized and not HAS_NUMPY:
+        raise TraverseError('NumPy is required for the vectorized traverse')
+    traverse = _traverse_numpy if vectorized else _traverse_python
+
+    result = TraverseResult()
+    beacon_nums = result.beacon_nums
+
+    def new_legs():
+        # is_anchor, anchor_x, anchor_y, deg, minutes, dist of unflushed rows
+        return (array('b'), array('d'), array('d'), array('d'), array('d'), array('d'))
+
+    def flush():
+        start = (result.xs[-1], result.ys[-1]) if result.xs else (0.0, 0.0)
+        xs, ys = traverse(start, *legs)
+        result.xs.extend(xs)
+        result.ys.extend(ys)
+        result.anchors.extend(legs[0])
+        ready = pending_parcels[:]
+        del pending_parcels[:]
+        return ready
+
+    def close_road(points, offset):
+        result.road_parcel.append(len(result.parcel_ids) - 1)
+        result.road_offset.append(offset)
+        result.road_vertex_start.append(len(result.road_vertices))
+        result.road_vertices.extend(points)
+        result.road_vertex_end.append(len(result.road_vertices))
+
+    def close_parcel():
+        # Roads still open at the end of a parcel are closed back to the
+        # first point of the file, as the worker always did
+        if is_offset:
+            road_points.append(0)
+            close_road(road_points, offset)
+        result.parcel_beacon_end.append(len(beacon_nums))
+        result.parcel_road_end.append(len(result.road_parcel))
+        pending_parcels.append(len(result.parcel_ids) - 1)
+
+    def bad_row(kind, message):
+        if errors is None:
+            raise TraverseError(message)
+        errors.append(RowError(processed_rows + 2, parcel_id, beacon_num, kind, message))
+
+    def open_parcel(parcel_id):
+        result.parcel_ids.append(parcel_id)
+        result.parcel_beacon_start.append(len(beacon_nums))
+        result.parcel_road_start.append(len(result.road_parcel))
+
+    legs = new_legs()
+    is_anchor, anchor_x, anchor_y, deg, minutes, dist = legs
+    pending_parcels = []
+    current_parcel_id = None
+    is_xy = True
+    is_offset = False
+    offset = None
+    road_points = []
+    processed_rows = 0
+
+    for row in rows:
+        if len(row) < N_COLUMNS:
+            row = list(row) + [''] * (N_COLUMNS - len(row))
+        parcel_id = row[COL_PARCEL_ID]
+        beacon_num = row[COL_BEACON_NUM]
+
+        x = y = 0.0
+        row_deg = row_min = row_dist = 0.0
+        if current_parcel_id is None:
+            try:
+                x = float(row[COL_X])
+                y = float(row[COL_Y])
+            except ValueError:
+                bad_row('no_start_xy', 'No XY values for starting point. Please check 1st Parcel')
+                x = y = math.nan
+            current_parcel_id = parcel_id
+            open_parcel(parcel_id)
+        else:
+            if parcel_id != current_parcel_id:
+                if not is_xy:
+                    bad_row('no_start_xy', f'No XY values for starting point. Please check Parcel: {parcel_id}')
+                close_parcel()
+                if len(is_anchor) >= chunk_rows:
+                    for k in flush():
+                        yield result, k
+                    legs = new_legs()
+                    is_anchor, anchor_x, anchor_y, deg, minutes, dist = legs
+                current_parcel_id = parcel_id
+                open_parcel(parcel_id)
+
+            is_xy = False
+            if row[COL_X] and row[COL_Y]:
+                is_xy = True
+                try:
+                    x = float(row[COL_X])
+                    y = float(row[COL_Y])
+                except ValueError:
+                    bad_row('invalid_xy', f'Invalid XY value. Please check Parcel: {parcel_id}, Beacon: {beacon_num}')
+                    x = y = math.nan
+            elif all(row[COL_DEG:COL_OFFSET]):
+                try:
+                    row_deg = float(row[COL_DEG])
+                    row_min = float(row[COL_MIN])
+                    row_dist = float(row[COL_DIST])
+                except ValueError:
+                    bad_row('invalid_bearing', f'Invalid Bearing/Distance value. Please check Parcel: {parcel_id}, Beacon: {beacon_num}')
+                    is_xy = True
+                    x = y = math.nan
+
+        index = len(beacon_nums)
+        is_anchor.append(is_xy)
+        anchor_x.append(x)
+        anchor_y.append(y)
+        deg.append(row_deg)
+        minutes.append(row_min)
+        dist.append(row_dist)
+        beacon_nums.append(beacon_num)
+
+        if is_offset:
+            road_points.append(index)
+            close_road(road_points, offset)
+            road_points = []
+            is_offset = False
+
+        if row[COL_OFFSET]:
+            try:
+                offset = float(row[COL_OFFSET])
+            except ValueError:
+                bad_row('invalid_offset', f'Invalid road offset value. Please check Parcel: {parcel_id}, Beacon: {beacon_num}')
+            else:
+                road_points.append(index)
+                is_offset = True
+
+        processed_rows += 1
+        if progress and processed_rows % progress_every == 0:
+            progress(processed_rows)
+
+    if current_parcel_id is None:
+        raise TraverseError('CSV file is empty or has no data rows')
+    close_parcel()
+    for k in flush():
+        yield result, k
+
+
+def traverse_rows(rows, progress=None, progress_every=25, vectorized=None, errors=None):
+    """Build a complete TraverseResult from CSV data rows (header already skipped)."""
+    result = None
+    for result, k in iter_traverse(rows, progress, progress_every, vectorized, chunk_rows=float('inf'), errors=errors):
+        pass
+    return result
+
+
+class CsvRowStream:
+    """Data rows of a CSV file, read in a single pass.
+
+    Tracks the byte offset reached in the file so progress can be reported
+    against the file size from ``os.stat`` without counting lines first.
+    With ``use_mmap`` the file is memory-mapped instead of read through a
+    buffered file object.
+    """
+
+    def __init__(self, csv_path, use_mmap=False, encoding='utf-8'):
+        self.csv_path = csv_path
+        self.use_mmap = use_mmap
+        self.encoding = encoding
+        self.size = os.stat(csv_path).st_size
+        self.offset = 0
+
+    @property
+    def percent(self):
+        return (self.offset / self.size) * 100 if self.size else 100.0
+
+    def _decode(self, raw_lines):
+        for raw in raw_lines:
+            self.offset += len(raw)
+            yield raw.decode(self.encoding)
+
+    def _rows(self, raw_lines):
+        reader = csv.reader(self._decode(raw_lines))
+        # Skip header row
+        next(reader, None)
+        yield from reader
+
+    def __iter__(self):
+        self.offset = 0
+        with open(self.csv_path, 'rb') as f:
+            # Empty files cannot be mapped
+            if self.use_mmap and self.size:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    yield from self._rows(iter(mm.readline, b''))
+            else:
+                yield from self._rows(f)
+
+
+def iter_parcels(csv_path, progress=None, progress_every=25, vectorized=None, use_mmap=False):
+    """Stream a survey plan CSV file, yielding ``(result, k)`` per parcel.
+
+    ``progress`` is called with the number of processed rows and the
+    percentage of the file read so far.
+    """
+    stream = CsvRowStream(csv_path, use_mmap)
+
+    def on_progress(processed_rows):
+        progress(processed_rows, stream.percent)
+
+    return iter_traverse(stream, on_progress if progress else None, progress_every, vectorized)
+
+
+def read_csv(csv_path, progress=None, progress_every=25, vectorized=None, use_mmap=False):
+    """Parse a whole survey plan CSV file into a TraverseResult."""
+    stream = CsvRowStream(csv_path, use_mmap)
+
+    def on_progress(processed_rows):
+        progress(processed_rows, stream.percent)
+
+    return traverse_rows(stream, on_progress if progress else None, progress_every, vectorized)